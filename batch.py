@@ -0,0 +1,173 @@
+import json
+import os
+import time
+import argparse
+import cProfile
+from concurrent.futures import ProcessPoolExecutor
+from reportlab.lib.colors import gray, black, toColor
+from reportlab.lib.pagesizes import landscape, A4
+from generator import PDFGenerator
+import utils
+import instrumentation
+
+# Renders several rosters in one process, so fonts, the image cache and the
+# text measurement caches are loaded once and shared by every job.
+#
+# Usage:
+#   python batch.py jobs.json
+#   python batch.py jobs.json --workers 4
+#   python batch.py jobs.json --stats stats.json         # Phase timers per job (.json or .csv)
+#   python batch.py jobs.json --print-stats --profile batch.prof
+#
+# jobs.json holds shared overrides plus one entry per output file:
+# {
+#     "custom_config": { ...overrides for every job... },
+#     "jobs": [
+#         {
+#             "input": "in-person-old-student-std.json",   # File in data/
+#             "output": "output_in-person-old-student-std.pdf",
+#             "top_right_text": "In-person & Old student",
+#             "landscape": false,
+#             "pages": [1, 2],                              # Optional: only render these pages
+#             "stream": false,                              # Optional: read participants one at a time
+#             "custom_config": { ...overrides for this job only... }
+#         }
+#     ]
+# }
+# Colors can be given by name or hex string (e.g. "gray", "#ff0000").
+
+def load_data(input_filename, stream=False):
+    """
+    Loads a roster from data/. With stream=True (or a .jsonl file) participants
+    are read one at a time and rendered in a single pass, for very large rosters.
+    """
+    path = os.path.join('data', input_filename)
+    if stream or path.endswith('.jsonl'):
+        return utils.load_participants(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def resolve_colors(value, key=None):
+    """Converts color strings (any key ending in 'color') into ReportLab colors."""
+    if isinstance(value, dict):
+        return {k: resolve_colors(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_colors(v) for v in value]
+    if isinstance(value, str) and key and key.endswith('color'):
+        return toColor(value)
+    return value
+
+def build_meta_info(top_right_text):
+    return [
+        {
+            "text": "Last updated: {{dd}}-{{mm}}-{{yyyy}}",
+            "font": "Helvetica",
+            "size": 12,
+            "color": gray,
+            "position": 1,
+            "padding": 20
+        },
+        {
+            "text": "Page {{page}}",
+            "font": "Helvetica-Bold",
+            "size": 14,
+            "color": black,
+            "position": 3,
+            "padding": 20
+        },
+        {
+            "text": top_right_text,
+            "font": "Helvetica",
+            "size": 12,
+            "color": gray,
+            "position": 9, # Top Right
+            "padding": 20
+        }
+    ]
+
+def run_job(job, shared_config):
+    """Renders one job profile and returns (output filename, stats of the run)."""
+    custom_config = dict(shared_config)
+    custom_config.update(job.get('custom_config') or {})
+
+    page_layout = landscape(A4) if job.get('landscape') else A4
+    meta_info = build_meta_info(job.get('top_right_text', ''))
+
+    start = time.perf_counter()
+    participants = load_data(job['input'], job.get('stream', False))
+    load_seconds = time.perf_counter() - start
+
+    pdf_gen = PDFGenerator(
+        job['output'],
+        page_layout,
+        job.get('header_info', []),
+        participants,
+        meta_info,
+        custom_config=resolve_colors(custom_config)
+    )
+    pdf_gen.stats.add_time('load', load_seconds)
+    pdf_gen.generate(pages=job.get('pages'))
+    return job['output'], pdf_gen.stats.as_dict()
+
+def run_jobs(args):
+    """Renders every job in args.jobs_file. Returns {output filename: stats}."""
+    with open(args.jobs_file, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    shared_config = spec.get('custom_config') or {}
+    jobs = spec['jobs']
+
+    results = {}
+    if args.workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            print(f"Rendering {job['output']}...")
+            output, stats = run_job(job, shared_config)
+            results[output] = stats
+        return results
+
+    # Each worker already renders a whole job, so photos are resampled
+    # inline instead of every job starting its own process pool.
+    shared_config = dict(shared_config)
+    shared_config.setdefault('IMAGE_WORKERS', 1)
+
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs))) as executor:
+        futures = [executor.submit(run_job, job, shared_config) for job in jobs]
+        for future in futures:
+            output, stats = future.result()
+            results[output] = stats
+            print(f"Rendered {output}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Render several participant galleries in one process.")
+    parser.add_argument('jobs_file', help="JSON file listing the jobs to render")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes to spread jobs across (default: 1)")
+    parser.add_argument('--stats', metavar='FILE',
+                        help="Save phase timers, counters and cache hit rates of every job (.json or .csv)")
+    parser.add_argument('--print-stats', action='store_true', help="Print the phase timers of every job")
+    parser.add_argument('--profile', metavar='FILE', help="Profile the run with cProfile and save it to FILE")
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile:
+        if args.workers > 1:
+            print("Warning: --profile only covers this process; use --workers 1 to profile the rendering.")
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        results = run_jobs(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile saved to {args.profile}")
+
+    if args.print_stats:
+        for output, stats in results.items():
+            print(f"{output}:")
+            instrumentation.print_stats(stats)
+    if args.stats:
+        instrumentation.write_stats(results, args.stats)
+
+if __name__ == "__main__":
+    main()
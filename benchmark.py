@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+from io import BytesIO
+from reportlab import Version as REPORTLAB_VERSION
+from reportlab.lib.pagesizes import A4
+from PIL import Image, __version__ as PILLOW_VERSION
+from generator import PDFGenerator
+import utils
+import images
+
+# Benchmarks the main stages on a synthetic roster, so the effect of a ReportLab
+# or Pillow upgrade, or of a config change, can be measured.
+#
+# Usage:
+#   python benchmark.py                                  # Writes benchmark.json
+#   python benchmark.py --participants 2000 --output after.json
+#   python benchmark.py --compare before.json            # Exit code 1 on regressions
+#   python benchmark.py --config '{"TABLE_RENDERER": "platypus"}'
+#
+# Everything (photos, caches, output PDFs) is created in a temporary folder.
+# The fonts from config.py are used, so run it from the project folder.
+
+LATIN_FIRST = ["Alice", "Bob", "Chandra", "Diego", "Emma", "Farid", "Grace", "Hiroshi", "Ines", "Jonas"]
+LATIN_LAST = ["Johnson", "Smith", "Tan", "Garcia", "Müller", "Okafor", "Lim", "Novak", "Wong", "Silva"]
+CJK_SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何林高罗"
+CJK_GIVEN = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超霞平刚桂"
+TABLE_KEYS = ["Age", "House", "Diet", "Room", "Course", "Seat", "Arrival", "Language", "Emergency contact"]
+TABLE_VALUES = ["16", "Blue", "Vegetarian", "B-204", "10-day", "Row 3", "Friday evening", "English / 中文",
+                "Parent, reachable after 6pm on weekdays"]
+
+# (width, height, format) of the synthetic portraits: small, typical phone photo, large camera photo
+PORTRAIT_SPECS = [
+    (300, 400, 'JPEG'),
+    (1200, 1600, 'JPEG'),
+    (3000, 4000, 'JPEG'),
+    (800, 1000, 'PNG'),
+]
+
+# Slowdowns smaller than this (in seconds) are treated as timing noise by --compare
+NOISE_SECONDS = 0.005
+
+def make_portraits(directory, count, seed=0):
+    """Writes 'count' textured portraits to directory, cycling through PORTRAIT_SPECS. Returns their file names."""
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        w, h, fmt = PORTRAIT_SPECS[i % len(PORTRAIT_SPECS)]
+        # Low-resolution noise scaled up: photo-like detail without slow full-size noise
+        base = Image.effect_noise((max(1, w // 8), max(1, h // 8)), rng.randint(20, 80))
+        with Image.merge('RGB', [base, base.rotate(90, expand=False), base.transpose(Image.Transpose.FLIP_LEFT_RIGHT)]) as im:
+            with im.resize((w, h), Image.Resampling.BICUBIC) as photo:
+                name = f"portrait_{i:05d}.{'jpg' if fmt == 'JPEG' else 'png'}"
+                photo.save(os.path.join(directory, name), format=fmt)
+        base.close()
+        names.append(name)
+    return names
+
+def make_roster(count, photo_names, missing_ratio=0.1, cjk_ratio=0.3, seed=0):
+    """
+    Returns 'count' synthetic participants: a mix of Latin and CJK names,
+    0-6 table rows with short and long values, and some missing photos.
+    """
+    rng = random.Random(seed)
+    participants = []
+    for i in range(count):
+        if rng.random() < cjk_ratio:
+            name = rng.choice(CJK_SURNAMES) + ''.join(rng.choice(CJK_GIVEN) for _ in range(rng.randint(1, 2)))
+        else:
+            name = f"{rng.choice(LATIN_FIRST)} {rng.choice(LATIN_LAST)}"
+            if rng.random() < 0.2:
+                name += f"-{rng.choice(LATIN_LAST)} {rng.choice(LATIN_LAST)}"  # Long names that wrap
+
+        if rng.random() < missing_ratio:
+            portrait = f"missing_{i}.jpg"
+        else:
+            portrait = photo_names[i % len(photo_names)]
+
+        rows = rng.randint(0, 6)
+        table_data = {key: rng.choice(TABLE_VALUES) for key in rng.sample(TABLE_KEYS, rows)}
+
+        participants.append({
+            "name": name,
+            "line1": f"Group {i % 12 + 1} - {'Old' if i % 3 else 'New'} student",
+            "potrait": portrait,
+            "table_data": table_data or None
+        })
+    return participants
+
+def time_it(func, repeat):
+    """Runs func 'repeat' times and returns the fastest time in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmarks(args, custom_config):
+    workdir = tempfile.mkdtemp(prefix='gallery-bench-')
+    try:
+        img_dir = os.path.join(workdir, 'img')
+        os.makedirs(img_dir)
+        photo_names = make_portraits(img_dir, args.photos, args.seed)
+        participants = make_roster(args.participants, photo_names, args.missing_ratio, args.cjk_ratio, args.seed)
+
+        base_config = {
+            'IMG_DIR': img_dir,
+            'PHOTO_REPORT': False,
+        }
+        base_config.update(custom_config)
+
+        def new_generator(filename, **overrides):
+            cfg = dict(base_config)
+            cfg.update(overrides)
+            return PDFGenerator(filename, A4, [], participants, [], custom_config=cfg)
+
+        # Only used for its compiled settings and registered fonts
+        cfg = new_generator(BytesIO()).cfg
+        with_tables = [p for p in participants if p['table_data']]
+        results = {}
+
+        def card_metrics():
+            utils.clear_text_caches()  # Measure a cold run, not cache hits
+            for p in participants:
+                utils.get_card_metrics(p, cfg)
+        results['card_metrics'] = time_it(card_metrics, args.repeat)
+
+        def table_build(renderer):
+            utils.clear_text_caches()
+            for p in with_tables:
+                rows = utils.prepare_table_rows(p['table_data'], cfg)
+                if renderer == 'direct':
+                    utils.KeyValueTable(rows, cfg)
+                else:
+                    utils.build_table([["\n".join(k), "\n".join(v)] for k, v in rows], cfg)
+        results['table_build_direct'] = time_it(lambda: table_build('direct'), args.repeat)
+        results['table_build_platypus'] = time_it(lambda: table_build('platypus'), args.repeat)
+
+        def resample():
+            target_w_px, target_h_px = cfg.IMAGE_TARGET_SIZE
+            for name in photo_names:
+                image = images.resample_image(os.path.join(img_dir, name), target_w_px, target_h_px, cfg.DRAFT_MODE)
+                if image is not None:
+                    image.close()
+        results['image_resample'] = time_it(resample, args.repeat)
+
+        # End to end: a cold image cache (every photo resampled), then a warm one
+        def generate(cache_dir, fresh):
+            if fresh:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            new_generator(os.path.join(workdir, 'bench.pdf'), IMAGE_CACHE_DIR=cache_dir).generate()
+        cache_dir = os.path.join(workdir, 'cache')
+        results['generate_cold_cache'] = time_it(lambda: generate(cache_dir, True), args.repeat)
+        results['generate_warm_cache'] = time_it(lambda: generate(cache_dir, False), args.repeat)
+        output_size = os.path.getsize(os.path.join(workdir, 'bench.pdf'))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'reportlab': REPORTLAB_VERSION,
+            'pillow': PILLOW_VERSION,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parameters': {
+            'participants': args.participants,
+            'photos': args.photos,
+            'missing_ratio': args.missing_ratio,
+            'cjk_ratio': args.cjk_ratio,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'config': custom_config,
+        },
+        'results': {name: round(seconds, 4) for name, seconds in results.items()},
+        'output_bytes': output_size,
+    }
+
+def compare(report, baseline, threshold):
+    """
+    Prints each timing next to the baseline's. Returns the names of results
+    more than 'threshold' (e.g. 0.1 = 10%) slower than the baseline.
+    """
+    if report['parameters'] != baseline.get('parameters'):
+        print("Warning: The baseline was run with different parameters; timings may not be comparable.")
+    for key in ('reportlab', 'pillow', 'python'):
+        old, new = baseline.get('environment', {}).get(key), report['environment'][key]
+        if old != new:
+            print(f"Note: {key} {old} -> {new}")
+
+    regressions = []
+    print(f"{'benchmark':<24}{'baseline':>10}{'now':>10}{'change':>9}")
+    for name, seconds in report['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            print(f"{name:<24}{'-':>10}{seconds:>10.3f}")
+            continue
+        change = seconds / old - 1
+        flag = ''
+        if change > threshold and seconds - old > NOISE_SECONDS:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<24}{old:>10.3f}{seconds:>10.3f}{change:>+9.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the participant gallery on a synthetic roster.")
+    parser.add_argument('--participants', type=int, default=500, help="Roster size (default: 500)")
+    parser.add_argument('--photos', type=int, default=40, help="Distinct synthetic portraits (default: 40)")
+    parser.add_argument('--missing-ratio', type=float, default=0.1, help="Share of participants without a photo file")
+    parser.add_argument('--cjk-ratio', type=float, default=0.3, help="Share of participants with CJK names")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per benchmark; the fastest counts (default: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic data")
+    parser.add_argument('--config', default='{}', help="JSON object of config overrides, as in custom_config")
+    parser.add_argument('--output', default='benchmark.json', help="Where to write the JSON report")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Slowdown that counts as a regression with --compare (default: 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args, json.loads(args.config))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if not args.compare:
+        for name, seconds in report['results'].items():
+            print(f"{name:<24}{seconds:>10.3f}s")
+        return
+
+    with open(args.compare, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,11 @@ FONT_PATH_BOLD = os.path.join('fonts', 'NotoSansSC-Bold.ttf')
 FONT_NAME_REGULAR = 'NotoRegular'
 FONT_NAME_BOLD = 'NotoBold'
 
+# Parsed fonts are cached here (keyed by the .ttf file's hash), so later runs
+# don't have to parse the large CJK font files again.
+ENABLE_FONT_CACHE = True
+FONT_CACHE_DIR = os.path.join('.cache', 'fonts')
+
 # Margins
 MARGIN_TOP = 40
 MARGIN_BOTTOM = 40
@@ -34,16 +39,92 @@ GRID_GAP_Y = 36
 # Formula: Gap = First_Line_Font_Size + TEXT_GAP_BUFFER
 TEXT_GAP_BUFFER = 4
 
+# Path of a JSON file to cache the layout plan in (None = don't cache).
+# When the roster, header and config are unchanged, the saved plan is reused, so
+# rendering a few pages (generate(pages=[...])) doesn't lay out the whole document again.
+LAYOUT_PLAN_FILE = None
+
+# Path of a JSON build manifest for incremental regeneration (None = always rebuild).
+# Records a fingerprint of the participants (and photos), layout and config.
+# If nothing changed since the last build and the PDF is untouched, generation is
+# skipped; otherwise the whole PDF is rendered again. Photos are re-encoded only for
+# changed files (see ENABLE_IMAGE_CACHE).
+INCREMENTAL_MANIFEST_FILE = None
+
+# Keep memory use low for very large rosters in small containers.
+# Photos are always embedded from files on disk (a temporary spool directory when
+# ENABLE_IMAGE_CACHE is off) instead of decoded images held until the PDF is written.
+# ReportLab itself keeps finished pages until save, so also stream the roster
+# (utils.load_participants) for the lowest peak.
+LOW_MEMORY = False
+
+# Number of wrapped strings remembered between cards (repeated values are measured once).
+# The caches are shared by every generator in the process: set it here, not in custom_config.
+TEXT_CACHE_SIZE = 10000
+
+# --- INSTRUMENTATION ---
+# Every run collects phase timers, counters, photo sizes, cache hit rates and peak
+# memory (pdf_gen.stats, see instrumentation.py). These write them out after generate().
+STATS_FILE = None                # Path of a .json (or .csv) file to save the stats to
+PRINT_STATS = False              # Print a summary of the phase timers
+PROFILE_FILE = None              # Run generate() under cProfile and save the profile here (read it with pstats)
+
+# Row packing: instead of filling rows strictly in roster order, cards of similar
+# height are put in the same row, so one tall card (long table, wrapped line) doesn't
+# stretch a row of short ones. Usually saves pages on large rosters, but changes the order.
+# ROW_PACKING_KEY (e.g. "line1") keeps participants with different values in separate rows,
+# groups following the roster order. Not available for streamed rosters.
+ROW_PACKING = False
+ROW_PACKING_KEY = None
+
 # Gap between the last line of text and the Table
 TABLE_TOP_MARGIN = 2
 # If True, the generator will calculate the lowest text point in the current row
 # and start ALL tables in that row at that same height.
 ALIGN_TABLES_ROW = False
 
+# --- PHOTOS ---
+IMG_DIR = 'img'                  # Folder the 'potrait' file names are looked up in (listed once per run)
+IMG_CASE_INSENSITIVE = False     # True: "Alice.JPG" in the data also finds img/alice.jpg
+PHOTO_REPORT = False             # True: print missing and unused photos before rendering
+
 # --- IMAGE OPTIMIZATION ---
 ENABLE_IMAGE_RESAMPLING = True   # Set to True to shrink large photos
 RESAMPLING_DPI = 200             # 200 is good for general A4 printing. Use 300 for high-quality.
 
+# Draft/proof mode for iterating on layout overrides: photos become small thumbnails
+# (DRAFT_DPI, fast decode, cached apart from the full-quality ones), so a proof renders
+# in seconds. Card positions, sizes and pagination are exactly those of the final PDF.
+DRAFT_MODE = False
+DRAFT_DPI = 36
+
+# How resampled photos are stored in the PDF:
+# 'jpeg'  -> DCT/JPEG, typically 5-10x smaller files (lossy)
+# 'flate' -> lossless compressed pixels (large)
+# Photos small enough to need no resampling are always embedded as their original file.
+IMAGE_ENCODING = 'jpeg'
+JPEG_QUALITY = 85                # 1-95. 85 is visually lossless for print at RESAMPLING_DPI.
+JPEG_SUBSAMPLING = '4:2:0'       # '4:4:4' keeps colour edges sharper at a larger size.
+BINARY_IMAGE_STREAMS = True      # Store image data as raw binary instead of ASCII85 text (~20% smaller).
+                                 # A ReportLab global, so it applies to the whole process: set it here, not in custom_config.
+
+# Resampled photos are cached on disk, so later runs skip decoding and resizing.
+# Entries are keyed by the photo's path/size/mtime and the target size, and the
+# least recently used ones are deleted once the cache grows past IMAGE_CACHE_MAX_MB.
+ENABLE_IMAGE_CACHE = True
+IMAGE_CACHE_DIR = os.path.join('.cache', 'images')
+IMAGE_CACHE_MAX_MB = 500
+
+# Worker processes used to resample all photos before drawing starts.
+# None uses every CPU core, 1 resamples inline while drawing. Needs ENABLE_IMAGE_CACHE.
+IMAGE_WORKERS = None
+
+# Background threads that load and resample the portraits of the next
+# IMAGE_PREFETCH_ROWS rows while the current row is being drawn (0 = off).
+# The number of rows read ahead caps how many loaded photos wait in memory.
+IMAGE_PREFETCH_ROWS = 2
+IMAGE_PREFETCH_THREADS = 2
+
 # Header defaults (Use Bold for header?)
 DEFAULT_HEADER_STYLE = {
     "text": "",
@@ -72,6 +153,11 @@ TABLE_OPTS = {
     "padding": 2
 }
 
+# How card tables are drawn:
+# 'direct'   -> key/value grid drawn straight onto the canvas (fast)
+# 'platypus' -> a ReportLab platypus Table (same look, much slower on table-heavy rosters)
+TABLE_RENDERER = 'direct'
+
 # --- PARTICIPANT DETAILS CONFIGURATION ---
 PARTICIPANT_STYLE = [
     {
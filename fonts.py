@@ -0,0 +1,102 @@
+import os
+import pickle
+import operator
+import threading
+from functools import partial
+from weakref import WeakKeyDictionary
+from reportlab import Version as REPORTLAB_VERSION
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont, TTFontFace
+import utils
+
+# Fonts registered by this process: name -> (path, size, mtime).
+# Lets later PDFGenerator instances skip registration entirely.
+_registered = {}
+# ReportLab's font registry is global, so generators created on different
+# threads register one at a time
+_register_lock = threading.RLock()
+
+def _dump_font(font, cache_path):
+    """
+    Pickles a parsed TTFont. The per-document subset state and the face's
+    unit scaling lambda cannot be pickled, so they are rebuilt in _load_font().
+    """
+    font_state = dict(vars(font))
+    font_state.pop('state', None)
+    face_state = dict(vars(font.face))
+    face_state.pop('_pdfScale', None)
+    font_state.pop('face')
+
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({'font': font_state, 'face': face_state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+def _load_font(name, cache_path):
+    with open(cache_path, 'rb') as f:
+        data = pickle.load(f)
+
+    face = TTFontFace.__new__(TTFontFace)
+    vars(face).update(data['face'])
+    if face.unitsPerEm == 1000:
+        face._pdfScale = partial(operator.mul, 1)
+    else:
+        face._pdfScale = partial(operator.mul, 1000 / face.unitsPerEm)
+
+    font = TTFont.__new__(TTFont)
+    vars(font).update(data['font'])
+    font.fontName = name
+    font.face = face
+    font.state = WeakKeyDictionary()
+    return font
+
+def load_ttfont(name, path, cache_dir=None):
+    """
+    Returns a TTFont for the .ttf at path.
+    If cache_dir is given, the parsed font is pickled there, keyed by the
+    file's hash, and later calls load the pickle instead of parsing the file.
+    """
+    if not cache_dir:
+        return TTFont(name, path)
+
+    digest = utils.get_file_digest(path)
+    cache_path = os.path.join(cache_dir, f"{digest}-rl{REPORTLAB_VERSION}.pkl")
+    if os.path.exists(cache_path):
+        try:
+            return _load_font(name, cache_path)
+        except Exception:
+            pass  # Corrupt or incompatible cache entry: parse again and overwrite it
+
+    font = TTFont(name, path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _dump_font(font, cache_path)
+    except Exception as e:
+        print(f"Warning: Could not cache font '{name}': {e}")
+    return font
+
+def register_font(name, path, cache_dir=None):
+    """
+    Registers a TrueType font with ReportLab and returns the name it is
+    registered under. That is 'name', unless this process already uses 'name'
+    for a different file: ReportLab keeps the first font registered under a
+    name, so the file then gets a name of its own, derived from its contents
+    ('NotoRegular-3f2a...'). Registering the same file again does nothing.
+    Raises if the font cannot be loaded. Safe to call from several threads.
+    """
+    st = os.stat(path)
+    signature = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _register_lock:
+        if _registered.get(name) == signature:
+            return name
+
+        if name in _registered or name in pdfmetrics.getRegisteredFontNames():
+            name = f"{name}-{utils.get_file_digest(path)[:12]}"
+            if name in _registered:
+                # Same contents as a font registered earlier (the file was copied or touched)
+                _registered[name] = signature
+                return name
+
+        pdfmetrics.registerFont(load_ttfont(name, path, cache_dir))
+        _registered[name] = signature
+        return name
@@ -1,13 +1,24 @@
 import os
+import time
+import shutil
+import cProfile
+import tempfile
+from io import BytesIO
+from collections.abc import Sequence
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from types import SimpleNamespace
+from itertools import islice
+from operator import itemgetter
 from reportlab.pdfgen import canvas
 from reportlab.lib.colors import black
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Table, TableStyle
-import config  # We import this ONLY to read defaults
+import settings
 import utils
+import images
+import fonts
+import layout
+import incremental
+import instrumentation
 
 try:
     from PIL import Image
@@ -17,90 +28,154 @@ except ImportError:
     HAS_PIL = False
     print("Warning: 'Pillow' library not found. Image optimization disabled.")
 
+# ReportLab globals from config.py, shared by every generator in this process
+settings.apply_process_settings()
+
+# Name of the Form XObject drawn for cards without a photo
+PLACEHOLDER_FORM = 'NoImagePlaceholder'
+# Name of the Form XObject holding the static meta_info of every page
+PAGE_CHROME_FORM = 'PageChrome'
+def get_source_size(source):
+    """Bytes of an image source as embedded: a file's size, or an in-memory JPEG's length (None if unknown)."""
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    fp = getattr(source, 'fp', None)
+    if isinstance(fp, BytesIO):
+        return fp.getbuffer().nbytes
+    return None
+
 class PDFGenerator:
-    def __init__(self, filename, pagesize, header_items, participants, meta_info=None, custom_config=None):
+    def __init__(self, filename, pagesize, header_items, participants, meta_info=None, custom_config=None,
+                 callbacks=None):
         """
         Initializes the generator with an optional custom_config dictionary.
         If custom_config is provided, it overrides values from config.py.
+        callbacks are registered on self.stats before any phase starts, so they
+        also see the 'fonts' phase timed here (see instrumentation.py).
         """
-        # 1. Load Defaults
-        # We assume all UPPERCASE variables in config.py are settings.
-        # We create a dictionary of these defaults.
-        default_settings = {k: v for k, v in vars(config).items() if k.isupper()}
-        
-        # 2. Apply Custom Overrides
-        if custom_config:
-            default_settings.update(custom_config)
-            
-        # 3. Create a Configuration Object
-        # SimpleNamespace allows us to access settings like objects: self.cfg.COL_WIDTH
-        self.cfg = SimpleNamespace(**default_settings)
+        # Timers and counters of this run (see instrumentation.py)
+        self.stats = instrumentation.RunStats()
+        for callback in callbacks or ():
+            self.stats.add_callback(callback)
 
-        # 4. Handle Page Size Logic
-        # Update the config object with the runtime page size
-        self.cfg.PAGE_WIDTH, self.cfg.PAGE_HEIGHT = pagesize
-        
-        # 5. Recalculate Dynamic Values (Widths)
-        # Since margins or page size might have changed, we must recalculate COL_WIDTH here.
-        available_width = self.cfg.PAGE_WIDTH - self.cfg.MARGIN_LEFT - self.cfg.MARGIN_RIGHT
-        total_gaps_width = (self.cfg.COLUMNS - 1) * self.cfg.GRID_GAP_X
-        self.cfg.COL_WIDTH = (available_width - total_gaps_width) / self.cfg.COLUMNS
+        # 1. Load Defaults and Apply Custom Overrides
+        # Unknown names in custom_config raise ValueError (they are usually typos).
+        values = settings.merge_overrides(custom_config)
 
-        # 6. Setup Canvas and State
+        # 2. Register Fonts
+        # Done before compiling, so a Helvetica fallback ends up in the settings.
+        with self.stats.phase('fonts'):
+            self.register_fonts(values)
+
+        # 3. Compile the Configuration Object
+        # Validates the values once, recalculates COL_WIDTH for this page size and
+        # precomputes the derived geometry. Read-only: self.cfg.COL_WIDTH, self.cfg.IMG_HEIGHT...
+        self.cfg = settings.Settings(values, pagesize)
+
+        # 4. Setup Canvas and State
+        self.filename = filename
         self.c = canvas.Canvas(filename, pagesize=pagesize)
         self.header_items = header_items
         self.participants = participants
         self.meta_info = meta_info if meta_info else []
+        # Date tokens use the time the run started, so every page shows the same date
+        self.run_date = datetime.now()
+        self.compiled_meta_info = None
         self.cursor_y = self.cfg.PAGE_HEIGHT - self.cfg.MARGIN_TOP
         self.page_number = 1
-        
-        # 7. Register Fonts
-        self.register_fonts()
+        self.page_started = False
+        self.page_cards = 0
+
+        # 5. Photo Index (IMG_DIR is listed once; lookups don't touch the disk)
+        self.image_index = images.ImageIndex(self.cfg.IMG_DIR, self.cfg.IMG_CASE_INSENSITIVE)
+
+        # 6. Image Cache (resampled portraits survive between runs)
+        self.image_cache = None
+        # In LOW_MEMORY mode without the cache, resampled photos are spooled to a
+        # temporary directory instead of being held as in-memory images
+        self.image_spool_dir = None
+        if self.cfg.ENABLE_IMAGE_RESAMPLING and HAS_PIL and (self.cfg.ENABLE_IMAGE_CACHE or self.cfg.LOW_MEMORY):
+            cache_dir, max_mb = self.cfg.IMAGE_CACHE_DIR, self.cfg.IMAGE_CACHE_MAX_MB
+            if not self.cfg.ENABLE_IMAGE_CACHE:
+                self.image_spool_dir = cache_dir = tempfile.mkdtemp(prefix='gallery-images-')
+                max_mb = float('inf')
+            self.image_cache = images.ImageCache(
+                cache_dir,
+                max_mb * 1024 * 1024,
+                encoding=self.cfg.IMAGE_ENCODING,
+                jpeg_quality=self.cfg.JPEG_QUALITY,
+                jpeg_subsampling=self.cfg.JPEG_SUBSAMPLING,
+                draft=self.cfg.DRAFT_MODE
+            )
+        # What to embed for each photo: img_path -> source, and content key -> source
+        self.image_sources = {}
+        self.sources_by_key = {}
+        # img_path -> Future of resolve_image_source(), for photos being prefetched
+        self.prefetched = {}
 
-    def register_fonts(self):
+    def register_fonts(self, values):
+        """
+        Registers the configured fonts. 'values' is the settings dict: if a font
+        is registered under another name (see fonts.register_font()) or falls
+        back to Helvetica, the font names and every style using it are updated.
+        """
+        # Parsed fonts are pickled here so later runs skip TTF parsing
+        cache_dir = values['FONT_CACHE_DIR'] if values['ENABLE_FONT_CACHE'] else None
+        # Configured font name -> name actually used (another registered name, or a
+        # Helvetica fallback for a missing font), also applied to header and meta_info items
+        self.font_aliases = {}
         fonts_to_register = [
-            (self.cfg.FONT_NAME_REGULAR, self.cfg.FONT_PATH_REGULAR),
-            (self.cfg.FONT_NAME_BOLD, self.cfg.FONT_PATH_BOLD)
+            (values['FONT_NAME_REGULAR'], values['FONT_PATH_REGULAR']),
+            (values['FONT_NAME_BOLD'], values['FONT_PATH_BOLD'])
         ]
 
         for name, path in fonts_to_register:
             try:
-                pdfmetrics.registerFont(TTFont(name, path))
+                registered_name = fonts.register_font(name, path, cache_dir)
+                if registered_name != name:
+                    self.font_aliases[name] = registered_name
+                    if name == values['FONT_NAME_REGULAR']:
+                        values['FONT_NAME_REGULAR'] = registered_name
+                    else:
+                        values['FONT_NAME_BOLD'] = registered_name
             except Exception as e:
                 print(f"WARNING: Could not load font '{name}' from '{path}'. Defaulting to Helvetica.")
-                # Fallback in our local config object only
-                if name == self.cfg.FONT_NAME_REGULAR:
-                    self.cfg.FONT_NAME_REGULAR = "Helvetica"
-                elif name == self.cfg.FONT_NAME_BOLD:
-                    self.cfg.FONT_NAME_BOLD = "Helvetica-Bold"
+                # Fallback in our local settings only
+                if name == values['FONT_NAME_REGULAR']:
+                    values['FONT_NAME_REGULAR'] = self.font_aliases[name] = "Helvetica"
+                elif name == values['FONT_NAME_BOLD']:
+                    values['FONT_NAME_BOLD'] = self.font_aliases[name] = "Helvetica-Bold"
 
-    def resolve_meta_text(self, text, page_num):
-        now = datetime.now()
+        if self.font_aliases:
+            settings.replace_fonts(values, self.font_aliases)
+
+    def resolve_date_tokens(self, text):
+        now = self.run_date
         resolved = text.replace("{{dd}}", now.strftime("%d"))
         resolved = resolved.replace("{{mm}}", now.strftime("%m"))
         resolved = resolved.replace("{{yyyy}}", now.strftime("%Y"))
-        resolved = resolved.replace("{{page}}", str(page_num))
         return resolved
 
-    def draw_meta_info(self):
-        if not self.meta_info:
-            return
+    def resolve_meta_text(self, text, page_num):
+        resolved = self.resolve_date_tokens(text)
+        resolved = resolved.replace("{{page}}", str(page_num))
+        return resolved
 
+    def compile_meta_info(self):
+        """
+        Resolves positions and date tokens of meta_info once per run.
+        Returns (static_items, page_items): items whose text is the same on every
+        page, and items using {{page}}, which must be drawn on each page.
+        """
         w, h = self.cfg.PAGE_WIDTH, self.cfg.PAGE_HEIGHT
-        
+        static_items = []
+        page_items = []
+
         for item in self.meta_info:
-            text_template = item.get('text', '')
-            font = item.get('font', 'Helvetica')
             size = item.get('size', 10)
-            color = item.get('color', black)
             pos = item.get('position', 1)
             padding = item.get('padding', 10)
 
-            resolved_text = self.resolve_meta_text(text_template, self.page_number)
-            
-            self.c.setFont(font, size)
-            self.c.setFillColor(color)
-            
             # Position Logic
             if pos in [1, 4, 7]: x = padding; align = 'left'
             elif pos in [2, 5, 8]: x = w / 2; align = 'center'
@@ -112,13 +187,61 @@ class PDFGenerator:
             elif pos in [7, 8, 9]: y = h - padding - size 
             else: y = padding
 
-            if align == 'center': self.c.drawCentredString(x, y, resolved_text)
-            elif align == 'right': self.c.drawRightString(x, y, resolved_text)
-            else: self.c.drawString(x, y, resolved_text)
+            compiled = {
+                'text': self.resolve_date_tokens(item.get('text', '')),
+                'font': self.get_font(item.get('font', 'Helvetica')),
+                'size': size,
+                'color': item.get('color', black),
+                'x': x,
+                'y': y,
+                'align': align
+            }
+            if "{{page}}" in compiled['text']:
+                page_items.append(compiled)
+            else:
+                static_items.append(compiled)
+
+        return static_items, page_items
+
+    def draw_meta_item(self, item, text):
+        self.c.setFont(item['font'], item['size'])
+        self.c.setFillColor(item['color'])
+
+        if item['align'] == 'center': self.c.drawCentredString(item['x'], item['y'], text)
+        elif item['align'] == 'right': self.c.drawRightString(item['x'], item['y'], text)
+        else: self.c.drawString(item['x'], item['y'], text)
+
+    def draw_meta_info(self):
+        """
+        Draws the page chrome. Static items are stored once as a Form XObject and
+        reused on every page; only {{page}} items are drawn per page.
+        """
+        if not self.meta_info:
+            return
+
+        if self.compiled_meta_info is None:
+            self.compiled_meta_info = self.compile_meta_info()
+        static_items, page_items = self.compiled_meta_info
+
+        if static_items:
+            if not self.c.hasForm(PAGE_CHROME_FORM):
+                self.c.beginForm(PAGE_CHROME_FORM)
+                for item in static_items:
+                    self.draw_meta_item(item, item['text'])
+                self.c.endForm()
+            self.c.doForm(PAGE_CHROME_FORM)
+
+        for item in page_items:
+            self.draw_meta_item(item, item['text'].replace("{{page}}", str(self.page_number)))
+
+    def get_font(self, name):
+        """Returns the registered font to use for the configured font 'name'."""
+        return self.font_aliases.get(name, name)
 
     def apply_header_defaults(self, item):
         defaults = self.cfg.DEFAULT_HEADER_STYLE.copy()
         defaults.update(item)
+        defaults['font'] = self.get_font(defaults['font'])
         return defaults
 
     def draw_header(self):
@@ -138,7 +261,213 @@ class PDFGenerator:
             self.cursor_y -= (attrs['size'] + attrs['bottom_padding'])
         self.cursor_y -= 20
 
-    def draw_participant_card(self, x, y, data, max_height, alignment_height=None):
+    def get_image_filename(self, data):
+        """Returns the photo file name a participant refers to, or None."""
+        img_filename = data.get('potrait')
+        if img_filename and isinstance(img_filename, str) and img_filename.strip():
+            return img_filename
+        return None
+
+    def get_image_path(self, data):
+        """Returns the path of a participant's photo, or None if it is missing."""
+        img_filename = self.get_image_filename(data)
+        if img_filename:
+            return self.image_index.find(img_filename)
+        return None
+
+    def print_photo_report(self, filenames):
+        """Prints which referenced photos are missing and which files in IMG_DIR are unused."""
+        missing, unused = self.image_index.get_report(filenames)
+        for label, names in (("missing", missing), ("unused", unused)):
+            if names:
+                shown = ', '.join(names[:10]) + (f" (+{len(names) - 10} more)" if len(names) > 10 else "")
+                print(f"Photos {label} in '{self.cfg.IMG_DIR}' ({len(names)}): {shown}")
+
+    def preprocess_images(self, participants=None):
+        """
+        Resamples every portrait (of 'participants', default: all) into the image
+        cache using a process pool, so the drawing loop only has to embed ready-made files.
+        Needs the image cache, since the cached files are what the workers hand back.
+        """
+        if not self.image_cache:
+            return
+
+        workers = self.cfg.IMAGE_WORKERS or os.cpu_count() or 1
+        if workers <= 1:
+            return
+
+        target_w_px, target_h_px = self.cfg.IMAGE_TARGET_SIZE
+
+        # Only send work to the pool for distinct photos that are not cached yet
+        path_keys = {}
+        pending = {}
+        # key -> (seconds, embedded_bytes), recorded here since workers can't update self.stats
+        loaded = {}
+        for p in (self.participants if participants is None else participants):
+            img_path = self.get_image_path(p)
+            if not img_path or img_path in path_keys:
+                continue
+            try:
+                key = self.get_image_key(img_path, target_w_px, target_h_px)
+            except OSError:
+                continue
+            path_keys[img_path] = key
+            if key in self.sources_by_key or key in pending:
+                continue
+            start = time.perf_counter()
+            hit, cached_path = self.image_cache.get(key)
+            if hit:
+                source = self.sources_by_key[key] = cached_path or img_path
+                loaded[key] = (time.perf_counter() - start, get_source_size(source))
+            else:
+                pending[key] = img_path
+
+        if len(pending) >= 2:
+            self.stats.count('photos_resampled_in_pool', len(pending))
+            keys = list(pending)
+            paths = [pending[k] for k in keys]
+            with ProcessPoolExecutor(max_workers=min(workers, len(keys))) as executor:
+                results = executor.map(
+                    images.cache_image,
+                    [self.image_cache] * len(keys),
+                    keys,
+                    paths,
+                    [target_w_px] * len(keys),
+                    [target_h_px] * len(keys),
+                    chunksize=max(1, len(keys) // (workers * 4))
+                )
+                for key, (source, seconds, embedded_bytes) in zip(keys, results):
+                    self.sources_by_key[key] = source
+                    loaded[key] = (seconds, embedded_bytes)
+
+        for img_path, key in path_keys.items():
+            if key in self.sources_by_key:
+                self.image_sources[img_path] = self.sources_by_key[key]
+                # Copies of the same photo are recorded once, as when drawing
+                if key in loaded:
+                    seconds, embedded_bytes = loaded.pop(key)
+                    self.stats.record_photo(img_path, seconds, self.image_index.get_stat(img_path)[0], embedded_bytes)
+
+    def get_image_key(self, img_path, target_w_px, target_h_px):
+        """Returns a content-based key, shared by every copy of the same photo."""
+        if self.image_cache:
+            return self.image_cache.make_key(
+                img_path, target_w_px, target_h_px, images.get_dpi(self.cfg),
+                stat=self.image_index.get_stat(img_path)
+            )
+        return utils.get_file_digest(img_path)
+
+    def get_image_source(self, img_path):
+        """
+        Returns what drawImage should embed for img_path: the original file,
+        a cached resample, or an in-memory ImageReader when caching is off.
+        Photos with identical contents get the same source, so they are
+        resampled once and embedded as a single image.
+        """
+        if not (self.cfg.ENABLE_IMAGE_RESAMPLING and HAS_PIL):
+            return img_path
+
+        if img_path in self.image_sources:
+            self.stats.count_photo_card(img_path)
+            return self.image_sources[img_path]
+
+        pending = self.prefetched.pop(img_path, None)
+        key, source = pending.result() if pending else self.resolve_image_source(img_path)
+        if key is not None:
+            # The first photo drawn with this content decides what is embedded
+            source = self.sources_by_key.setdefault(key, source)
+        self.image_sources[img_path] = source
+        self.stats.count_photo_card(img_path)
+        return source
+
+    def resolve_image_source(self, img_path):
+        """
+        Returns (key, source) for img_path, resampling it if needed. key is None
+        if the photo could not be processed (the original file is embedded).
+        Only reads shared state, so it can run on prefetch threads.
+        """
+        try:
+            target_w_px, target_h_px = self.cfg.IMAGE_TARGET_SIZE
+            key = self.get_image_key(img_path, target_w_px, target_h_px)
+            if key in self.sources_by_key:
+                return key, self.sources_by_key[key]
+            start = time.perf_counter()
+            source = self.load_image_source(key, img_path, target_w_px, target_h_px)
+            self.stats.record_photo(
+                img_path,
+                time.perf_counter() - start,
+                self.image_index.get_stat(img_path)[0],
+                get_source_size(source)
+            )
+            return key, source
+        except Exception:
+            return None, img_path
+
+    def prefetch_images(self, items, get_participant):
+        """
+        Yields 'items' (cards about to be drawn) unchanged and in order, while
+        IMAGE_PREFETCH_THREADS background threads load and resample the portraits
+        of the next IMAGE_PREFETCH_ROWS rows. At most that many rows are read
+        ahead, which caps the memory held by waiting photos.
+        """
+        depth = self.cfg.IMAGE_PREFETCH_ROWS * self.cfg.COLUMNS
+        if not (depth > 0 and self.cfg.IMAGE_PREFETCH_THREADS > 0
+                and self.cfg.ENABLE_IMAGE_RESAMPLING and HAS_PIL):
+            yield from items
+            return
+
+        window = deque()
+        executor = ThreadPoolExecutor(max_workers=self.cfg.IMAGE_PREFETCH_THREADS)
+        try:
+            for item in items:
+                img_path = self.get_image_path(get_participant(item))
+                if img_path and img_path not in self.image_sources and img_path not in self.prefetched:
+                    self.prefetched[img_path] = executor.submit(self.resolve_image_source, img_path)
+                window.append(item)
+                if len(window) > depth:
+                    yield window.popleft()
+            while window:
+                yield window.popleft()
+        finally:
+            # Photos not drawn (e.g. the run failed) need not be loaded; shutdown(cancel_futures=) is 3.9+
+            for future in self.prefetched.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+            self.prefetched.clear()
+
+    def load_image_source(self, key, img_path, target_w_px, target_h_px):
+        """Resamples a photo (through the image cache if enabled) and returns the source to embed."""
+        if self.image_cache:
+            return self.image_cache.fetch(key, img_path, target_w_px, target_h_px) or img_path
+
+        im_resized = images.resample_image(img_path, target_w_px, target_h_px, self.cfg.DRAFT_MODE)
+        if im_resized is None:
+            return img_path
+        if self.cfg.IMAGE_ENCODING == 'jpeg':
+            buf = BytesIO()
+            images.encode_image(im_resized, buf, 'jpeg', self.cfg.JPEG_QUALITY, self.cfg.JPEG_SUBSAMPLING)
+            buf.seek(0)
+            return ImageReader(buf)
+        return ImageReader(im_resized)
+
+    def draw_placeholder(self, x, y, img_h):
+        """
+        Draws the 'No Image' box for a card without a photo.
+        The box is defined once as a Form XObject and reused by every such card.
+        """
+        if not self.c.hasForm(PLACEHOLDER_FORM):
+            self.c.beginForm(PLACEHOLDER_FORM, lowerx=0, lowery=-img_h, upperx=self.cfg.COL_WIDTH, uppery=0)
+            self.c.setFont("Helvetica", 8)
+            self.c.drawString(0, -20, "No Image")
+            self.c.rect(0, -img_h, self.cfg.COL_WIDTH, img_h)
+            self.c.endForm()
+
+        self.c.saveState()
+        self.c.translate(x, y)
+        self.c.doForm(PLACEHOLDER_FORM)
+        self.c.restoreState()
+
+    def draw_participant_card(self, x, y, data, max_height, alignment_height=None, card_layout=None):
         """
         Draws a single participant card.
         
@@ -149,176 +478,311 @@ class PDFGenerator:
             max_height (float): Max height of this row (for clearing space).
             alignment_height (float, optional): If set, this is the height from 'y' 
                 where the table MUST start. This forces alignment across the row.
+            card_layout (dict, optional): The card's layout from utils.get_card_metrics().
+                Computed here if not given.
         """
         # 1. Draw Image
-        img_filename = data.get('potrait') 
-        img_h = self.cfg.COL_WIDTH / self.cfg.IMG_ASPECT_RATIO
+        img_path = self.get_image_path(data)
+        img_h = self.cfg.IMG_HEIGHT
         image_drawn = False
 
-        if img_filename and isinstance(img_filename, str) and img_filename.strip():
-            img_path = os.path.join("img", img_filename)
-            if os.path.exists(img_path) and os.path.isfile(img_path):
-                try:
-                    img_y_bottom = y - img_h
-                    
-                    # Use self.cfg for settings
-                    image_source = img_path 
-                    if self.cfg.ENABLE_IMAGE_RESAMPLING and HAS_PIL:
-                        try:
-                            target_w_px = int((self.cfg.COL_WIDTH / 72.0) * self.cfg.RESAMPLING_DPI)
-                            target_h_px = int((img_h / 72.0) * self.cfg.RESAMPLING_DPI)
-                            
-                            with Image.open(img_path) as im:
-                                if im.width > target_w_px * 1.2 or im.height > target_h_px * 1.2:
-                                    if im.mode not in ('L', 'RGB'):
-                                        im = im.convert('RGB')
-                                    im_resized = im.resize((target_w_px, target_h_px), Image.Resampling.LANCZOS)
-                                    image_source = ImageReader(im_resized)
-                        except Exception as e:
-                            pass 
-
-                    self.c.drawImage(image_source, x, img_y_bottom, width=self.cfg.COL_WIDTH, height=img_h)
-                    self.c.rect(x, img_y_bottom, self.cfg.COL_WIDTH, img_h)
-                    image_drawn = True
-                except Exception:
-                    pass
+        if img_path:
+            try:
+                img_y_bottom = y - img_h
+                image_source = self.get_image_source(img_path)
+
+                self.c.drawImage(image_source, x, img_y_bottom, width=self.cfg.COL_WIDTH, height=img_h)
+                self.c.rect(x, img_y_bottom, self.cfg.COL_WIDTH, img_h)
+                image_drawn = True
+            except Exception:
+                pass
         
         if not image_drawn:
-            self.c.setFont("Helvetica", 8)
-            self.c.drawString(x, y - 20, "No Image") 
-            self.c.rect(x, y - img_h, self.cfg.COL_WIDTH, img_h)
+            self.draw_placeholder(x, y, img_h)
+            self.stats.count('placeholders')
+        self.stats.count('cards')
+        self.page_cards += 1
 
         # 2. Draw Text Details
-        first_line_size = self.cfg.PARTICIPANT_STYLE[0]['size']
-        text_gap = first_line_size + self.cfg.TEXT_GAP_BUFFER
-        text_y = y - img_h - text_gap
-        
-        for field in self.cfg.PARTICIPANT_STYLE:
+        if card_layout is None:
+            card_layout = utils.get_card_metrics(data, self.cfg)
+
+        for field, lines in card_layout['text_lines']:
             self.c.setFont(field['font'], field['size'])
             self.c.setFillColor(field['color'])
-            
-            val = str(data.get(field['key'], '-'))
-            full_text = f"{field['label']}{val}"
-            
-            # PASS self.cfg TO UTILS
-            wrapped = utils.get_wrapped_text_lines(
-                full_text, 
-                field['font'], 
-                field['size'], 
-                self.cfg.COL_WIDTH - 4 
-            )
-            
-            line_height = field['size'] * 1.2
-            for w_line in wrapped:
-                self.c.drawString(x, text_y, w_line)
-                text_y -= line_height
-            text_y -= field['padding']
+            for w_line, offset in lines:
+                self.c.drawString(x, y - offset, w_line)
 
         # 3. Draw Table
-        raw_table_data = data.get('table_data')
-        if raw_table_data:
-            # PASS self.cfg TO UTILS
-            formatted_data = utils.prepare_table_data(raw_table_data, self.cfg)
-            if formatted_data:
-                col_width_key = self.cfg.COL_WIDTH * self.cfg.TABLE_OPTS['key_col_ratio']
-                col_width_val = self.cfg.COL_WIDTH * (1 - self.cfg.TABLE_OPTS['key_col_ratio'])
+        t = card_layout['table']
+        if t is not None:
+            # ALIGNMENT LOGIC:
+            if alignment_height is not None:
+                # If alignment is requested, we FORCE the table to start at a specific Y relative to the top (y).
+                # alignment_height is the height of the non-table content (image + text) used for the row.
+                # table_y = y - alignment_height - top_margin - table_height
                 
-                t = Table(formatted_data, colWidths=[col_width_key, col_width_val])
-                t.setStyle(TableStyle([
-                    ('FONT', (0, 0), (-1, -1), self.cfg.TABLE_OPTS['font'], self.cfg.TABLE_OPTS['size']),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), self.cfg.TABLE_OPTS['text_color']),
-                    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                    ('GRID', (0, 0), (-1, -1), self.cfg.TABLE_OPTS['border_width'], self.cfg.TABLE_OPTS['border_color']),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), self.cfg.TABLE_OPTS['padding']),
-                    ('TOPPADDING', (0, 0), (-1, -1), self.cfg.TABLE_OPTS['padding']),
-                ]))
+                # Note: the text bottom sits at y - non_table_height.
+                # We ignore it and jump to the aligned position.
                 
-                # ALIGNMENT LOGIC:
-                if alignment_height is not None:
-                    # If alignment is requested, we FORCE the table to start at a specific Y relative to the top (y).
-                    # alignment_height is the height of the non-table content (image + text) used for the row.
-                    # table_y = y - alignment_height - top_margin - table_height
-                    
-                    # Note: text_y currently sits at the bottom of the text.
-                    # We ignore current text_y and jump to the aligned position.
-                    
-                    table_start_y = y - alignment_height - self.cfg.TABLE_TOP_MARGIN
-                    
-                else:
-                    # Default behavior: Start immediately after the text
-                    table_start_y = text_y - self.cfg.TABLE_TOP_MARGIN 
+                table_start_y = y - alignment_height - self.cfg.TABLE_TOP_MARGIN
                 
-                w, h = t.wrap(self.cfg.COL_WIDTH, self.cfg.PAGE_HEIGHT)
-                table_y_position = table_start_y - h
-                t.drawOn(self.c, x, table_y_position)
+            else:
+                # Default behavior: Start immediately after the text
+                table_start_y = y - card_layout['non_table_height'] - self.cfg.TABLE_TOP_MARGIN 
+            
+            table_y_position = table_start_y - card_layout['table_height']
+            t.drawOn(self.c, x, table_y_position)
 
-    def generate(self):
-        self.draw_header()
-        rows = [self.participants[i:i + self.cfg.COLUMNS] for i in range(0, len(self.participants), self.cfg.COLUMNS)]
-        
+    def measure_rows(self, rows):
+        """
+        Yields (row, row_metrics) for each row, in order. Rows are lists of
+        (participant_index, participant) pairs, pulled lazily from 'rows'.
+        """
+        timings = self.stats.layout_timings
         for row in rows:
-            # Calculate metrics for all items in the row
-            row_metrics = [utils.get_card_metrics(p, self.cfg) for p in row]
-            
-            max_row_height = 0
-            alignment_height = None
-            
-            # Check if alignment is enabled in config
-            if hasattr(self.cfg, 'ALIGN_TABLES_ROW') and self.cfg.ALIGN_TABLES_ROW:
-                # 1. Find the maximum non-table height (image + text) in this row
-                #    This defines the common starting line for all tables.
-                max_non_table_height = 0
-                for m in row_metrics:
-                    if m['non_table_height'] > max_non_table_height:
-                        max_non_table_height = m['non_table_height']
-                
-                alignment_height = max_non_table_height
-                
-                # 2. Calculate the effective total height for each card based on this aligned start
-                final_card_heights = []
-                for m in row_metrics:
-                    # Even if a card has short text, its effective height is determined by the 
-                    # aligned table start position + its own table height.
-                    card_h = alignment_height
-                    if m['table_height'] > 0:
-                        card_h += m['table_top_margin'] + m['table_height']
-                    card_h += m['img_border_width']
-                    final_card_heights.append(card_h)
-                
-                max_row_height = max(final_card_heights) if final_card_heights else 0
-                
+            yield row, [utils.get_card_metrics(p, self.cfg, timings) for _, p in row]
+
+    def get_header_height(self):
+        """Height taken by draw_header() at the top of the first page."""
+        height = 0
+        for item in self.header_items:
+            attrs = self.apply_header_defaults(item)
+            height += attrs['size'] + attrs['bottom_padding']
+        return height + 20
+
+    def build_layout_plan(self):
+        """
+        Layout pass: measures every card and decides where it goes, before
+        anything is drawn. Returns (plan, layouts); see layout.paginate().
+        """
+        rows = layout.iter_rows(self.participants, self.cfg.COLUMNS)
+        start_y = self.cfg.PAGE_HEIGHT - self.cfg.MARGIN_TOP - self.get_header_height()
+        measured_rows = self.measure_rows(rows)
+
+        if self.cfg.ROW_PACKING:
+            measured_rows = list(measured_rows)
+            unpacked_pages = layout.count_pages(measured_rows, self.cfg, start_y)
+            measured_rows = layout.pack_rows(measured_rows, self.cfg.COLUMNS, self.cfg.ROW_PACKING_KEY)
+            plan, layouts = layout.paginate(measured_rows, self.cfg, start_y)
+            print(f"Row packing: {plan['page_count']} pages (in roster order: {unpacked_pages}).")
+            return plan, layouts
+        return layout.paginate(measured_rows, self.cfg, start_y)
+
+    def get_layout_plan(self):
+        """
+        Returns (plan, layouts). With LAYOUT_PLAN_FILE set, a saved plan for the
+        same roster and config is reused; its layouts are then measured only
+        for the cards that actually get drawn.
+        """
+        plan_file = self.cfg.LAYOUT_PLAN_FILE
+        if not plan_file:
+            return self.build_layout_plan()
+
+        fingerprint = layout.get_fingerprint(self.participants, self.header_items, self.cfg)
+        plan = layout.load_plan(plan_file, fingerprint)
+        if plan is not None:
+            return plan, {}
+
+        plan, layouts = self.build_layout_plan()
+        plan['fingerprint'] = fingerprint
+        layout.save_plan(plan, plan_file)
+        return plan, layouts
+
+    def begin_page(self, page_number):
+        """Starts a new page (the canvas is already on the first one) and draws the header on page 1."""
+        if self.page_started:
+            self.finish_page()
+            self.c.showPage()
+        self.page_started = True
+        self.page_number = page_number
+        self.page_cards = 0
+        self.stats.count('pages')
+        if page_number == 1:
+            self.draw_header()
+
+    def finish_page(self):
+        """Reports the page being closed to the stats callbacks."""
+        self.stats.emit('page', self.page_number, self.page_cards)
+
+    def save_document(self):
+        """Writes the PDF, then updates the image cache (or removes the LOW_MEMORY spool)."""
+        if self.page_started:
+            self.finish_page()
+        with self.stats.phase('save'):
+            self.c.save()
+        if self.image_spool_dir:
+            shutil.rmtree(self.image_spool_dir, ignore_errors=True)
+        elif self.image_cache:
+            self.image_cache.save(self.image_index)
+
+    def generate(self, pages=None):
+        """
+        Renders the PDF.
+
+        Args:
+            pages (iterable of int, optional): Only render these page numbers
+                (1-based), e.g. pages=[3] for a quick proof of page 3.
+                Page numbers in meta_info still show the real page number.
+
+        Timers and counters of the run are collected in self.stats, and written
+        out as set by STATS_FILE, PRINT_STATS and PROFILE_FILE.
+        """
+        if self.cfg.DRAFT_MODE:
+            print(f"Draft mode: photos are embedded at {self.cfg.DRAFT_DPI} DPI.")
+        text_caches = utils.get_text_cache_stats()
+        image_cache = (self.image_cache.hits, self.image_cache.misses) if self.image_cache else None
+
+        if self.cfg.PROFILE_FILE:
+            profiler = cProfile.Profile()
+            profiler.runcall(self.render, pages)
+            profiler.dump_stats(self.cfg.PROFILE_FILE)
+            print(f"Profile saved to {self.cfg.PROFILE_FILE}")
+        else:
+            self.render(pages)
+
+        # Hit rates of this run only; the text caches are shared between runs
+        for name, (hits, misses) in utils.get_text_cache_stats().items():
+            self.stats.set_cache(name, hits - text_caches[name][0], misses - text_caches[name][1])
+        if image_cache:
+            self.stats.set_cache('image', self.image_cache.hits - image_cache[0], self.image_cache.misses - image_cache[1])
+        self.stats.add_layout_timings()
+
+        if self.cfg.STATS_FILE:
+            instrumentation.write_stats(self.stats.as_dict(), self.cfg.STATS_FILE)
+        if self.cfg.PRINT_STATS:
+            instrumentation.print_stats(self.stats.as_dict())
+
+    def render(self, pages=None):
+        """Renders the PDF; see generate()."""
+        if not isinstance(self.participants, Sequence):
+            return self.generate_stream(pages)
+
+        # Incremental builds only apply to complete documents written to a file
+        manifest_file = self.cfg.INCREMENTAL_MANIFEST_FILE
+        if pages is not None or not isinstance(self.filename, str):
+            manifest_file = None
+
+        if manifest_file:
+            participant_hashes = [
+                incremental.get_participant_hash(p, img_path, img_path and self.image_index.get_stat(img_path))
+                for p, img_path in ((p, self.get_image_path(p)) for p in self.participants)
+            ]
+            fingerprint = incremental.get_build_fingerprint(
+                layout.get_fingerprint(self.participants, self.header_items, self.cfg),
+                participant_hashes,
+                # Whole items (font, size, color, position...), with today's date filled in
+                [dict(item, text=self.resolve_date_tokens(str(item.get('text', '')))) for item in self.meta_info]
+            )
+            if incremental.is_up_to_date(incremental.load_manifest(manifest_file), fingerprint, self.filename):
+                print(f"PDF is up to date, skipping generation.")
+                return
+
+        if self.cfg.PHOTO_REPORT:
+            self.print_photo_report(filter(None, map(self.get_image_filename, self.participants)))
+
+        with self.stats.phase('layout'):
+            plan, layouts = self.get_layout_plan()
+        wanted = set(pages) if pages is not None else None
+
+        cards_by_page = {}
+        for card in plan['cards']:
+            if wanted is None or card['page'] in wanted:
+                cards_by_page.setdefault(card['page'], []).append(card)
+
+        with self.stats.phase('images'):
+            if wanted is None:
+                self.preprocess_images()
             else:
-                # Standard behavior: simple max of individual totals
-                total_heights = []
-                for m in row_metrics:
-                    total = m['non_table_height']
-                    if m['table_height'] > 0:
-                        total += m['table_top_margin'] + m['table_height']
-                    total += m['img_border_width']
-                    total_heights.append(total)
-                    
-                max_row_height = max(total_heights) if total_heights else 0
-
-            # Check for page break
-            if (self.cursor_y - max_row_height) < self.cfg.MARGIN_BOTTOM:
+                self.preprocess_images([self.participants[card['index']] for cards in cards_by_page.values() for card in cards])
+
+        page_numbers = [n for n in range(1, plan['page_count'] + 1) if wanted is None or n in wanted]
+        # One stream of cards across pages, so photos are prefetched past page breaks
+        cards = self.prefetch_images(
+            (card for n in page_numbers for card in cards_by_page.get(n, [])),
+            lambda card: self.participants[card['index']]
+        )
+
+        with self.stats.phase('draw'):
+            for page_number in page_numbers:
+                self.begin_page(page_number)
+
+                for card in islice(cards, len(cards_by_page.get(page_number, []))):
+                    self.draw_participant_card(
+                        card['x'], 
+                        card['y'], 
+                        self.participants[card['index']], 
+                        card['row_height'],
+                        alignment_height=card['alignment_height'], # Pass the alignment value
+                        card_layout=layouts.pop(card['index'], None)  # Released once drawn
+                    )
+                    self.cursor_y = card['y'] - (card['row_height'] + self.cfg.GRID_GAP_Y)
+
                 self.draw_meta_info()
-                self.c.showPage()
-                self.page_number += 1
-                self.cursor_y = self.cfg.PAGE_HEIGHT - self.cfg.MARGIN_TOP
-            
-            current_x = self.cfg.MARGIN_LEFT
-            for i, participant in enumerate(row):
+
+            cards.close()
+        self.save_document()
+
+        if manifest_file:
+            incremental.save_manifest(incremental.build_manifest(fingerprint, self.filename), manifest_file)
+        print(f"PDF Generated successfully.")
+
+    def generate_stream(self, pages=None):
+        """
+        Single-pass rendering for participants given as an iterator, e.g. from
+        utils.load_participants(). Each row is read, measured, placed and drawn
+        before the next one is read, so memory stays flat however long the roster is.
+        Photos are resampled while drawing, and the layout plan cache and build
+        manifest are not used, since both need the whole roster up front.
+        """
+        if self.cfg.LAYOUT_PLAN_FILE or self.cfg.INCREMENTAL_MANIFEST_FILE or self.cfg.ROW_PACKING:
+            print("Warning: Streamed participants are rendered in one pass; LAYOUT_PLAN_FILE, INCREMENTAL_MANIFEST_FILE and ROW_PACKING are ignored.")
+        wanted = set(pages) if pages is not None else None
+        last_page = max(wanted) if wanted else None
+
+        rows = layout.iter_rows(self.participants, self.cfg.COLUMNS)
+        timings = self.stats.layout_timings
+        measured_rows = ((row, [utils.get_card_metrics(p, self.cfg, timings) for _, p in row]) for row in rows)
+        start_y = self.cfg.PAGE_HEIGHT - self.cfg.MARGIN_TOP - self.get_header_height()
+
+        # The roster is only known once it has been read, so photos are reported at the end
+        filenames = set() if self.cfg.PHOTO_REPORT and wanted is None else None
+
+        placements = self.prefetch_images(
+            layout.iter_placements(measured_rows, self.cfg, start_y),
+            itemgetter(1)
+        )
+        with self.stats.phase('render'):
+            for card, participant, metrics in placements:
+                if filenames is not None:
+                    filenames.add(self.get_image_filename(participant))
+                if last_page is not None and card['page'] > last_page:
+                    break
+                if wanted is not None and card['page'] not in wanted:
+                    continue
+                if card['page'] != self.page_number or not self.page_started:
+                    if self.page_started:
+                        self.draw_meta_info()
+                    self.begin_page(card['page'])
+
                 self.draw_participant_card(
-                    current_x, 
-                    self.cursor_y, 
-                    participant, 
-                    max_row_height,
-                    alignment_height=alignment_height # Pass the alignment value
+                    card['x'],
+                    card['y'],
+                    participant,
+                    card['row_height'],
+                    alignment_height=card['alignment_height'],
+                    card_layout=metrics
                 )
-                current_x += self.cfg.COL_WIDTH + self.cfg.GRID_GAP_X
-            
-            self.cursor_y -= (max_row_height + self.cfg.GRID_GAP_Y)
-        
-        self.draw_meta_info()
-        self.c.save()
-        print(f"PDF Generated successfully.")
\ No newline at end of file
+                self.cursor_y = card['y'] - (card['row_height'] + self.cfg.GRID_GAP_Y)
+            placements.close()
+
+            if not self.page_started and (wanted is None or 1 in wanted):
+                self.begin_page(1)  # Empty roster: still emit page 1 with its header
+            if self.page_started:
+                self.draw_meta_info()
+
+        self.save_document()
+        if filenames is not None:
+            filenames.discard(None)
+            self.print_photo_report(filenames)
+        print(f"PDF Generated successfully.")
@@ -0,0 +1,411 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+import utils
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+# Remembers the content digest of each photo (by path, size and mtime), so
+# warm runs don't have to read every photo just to compute its cache key.
+DIGEST_INDEX = 'digests.json'
+# Digests kept in DIGEST_INDEX; beyond this, those not used for the longest are forgotten
+MAX_DIGESTS = 50000
+
+# Marker suffix for cache entries whose source was already small enough.
+# The entry is an empty file: on a warm run we embed the original photo without opening it.
+ORIGINAL_MARKER = '.orig'
+
+# How resampled images are stored, and so embedded in the PDF.
+# ReportLab copies .jpg files into the PDF as-is (DCTDecode); .png files are
+# decoded and stored as lossless Flate-compressed pixels.
+ENCODING_SUFFIXES = {
+    'jpeg': '.jpg',
+    'flate': '.png',
+}
+
+# Names of the files the cache writes: '<sha1 key><suffix>' entries, and the temporary
+# files of entries and the digest index being written ('<name>.<pid>.<thread>.tmp').
+# Nothing else in the cache directory is ever counted or deleted.
+ENTRY_NAME = re.compile(r'[0-9a-f]{40}(%s)' % '|'.join(
+    re.escape(suffix) for suffix in (*ENCODING_SUFFIXES.values(), ORIGINAL_MARKER)))
+TMP_NAME = re.compile(r'([0-9a-f]{40}(%s)|%s)\.\d+\.\d+\.tmp' % (
+    '|'.join(re.escape(suffix) for suffix in ENCODING_SUFFIXES.values()), re.escape(DIGEST_INDEX)))
+# Temporary files older than this were left behind by a crashed run
+STALE_TMP_SECONDS = 3600
+
+# Large photos are shrunk in steps: JPEGs are decoded at a reduced scale (Image.draft)
+# and then reduced by a whole factor (Image.reduce), both only while the image stays at
+# least REDUCING_GAP times the target size. The final LANCZOS resize runs on what is left.
+# 3 is indistinguishable from resizing the full-size photo.
+REDUCING_GAP = 3.0
+
+def get_dpi(cfg):
+    """Resolution photos are resampled at: DRAFT_DPI in draft mode, else RESAMPLING_DPI."""
+    return cfg.DRAFT_DPI if cfg.DRAFT_MODE else cfg.RESAMPLING_DPI
+
+def get_target_size(cfg):
+    """
+    Returns the (width, height) in pixels a portrait should be resampled to,
+    based on the column width, aspect ratio and get_dpi().
+    """
+    dpi = get_dpi(cfg)
+    img_h = cfg.COL_WIDTH / cfg.IMG_ASPECT_RATIO
+    target_w_px = int((cfg.COL_WIDTH / 72.0) * dpi)
+    target_h_px = int((img_h / 72.0) * dpi)
+    return target_w_px, target_h_px
+
+def resample_image(img_path, target_w_px, target_h_px, draft=False):
+    """
+    Opens img_path and shrinks it to the target size.
+    Returns the resized PIL image, or None if the photo is already small enough
+    to be embedded as-is.
+    With draft=True (thumbnails for proofs), the photo is shrunk as far as
+    possible before a bilinear resize instead of LANCZOS.
+    """
+    with Image.open(img_path) as im:
+        if im.width > target_w_px * 1.2 or im.height > target_h_px * 1.2:
+            gap, method = (1.0, Image.Resampling.BILINEAR) if draft else (REDUCING_GAP, Image.Resampling.LANCZOS)
+            # JPEG only: decode at 1/2, 1/4 or 1/8 scale, still 'gap' times the target size
+            im.draft('RGB', (int(target_w_px * gap), int(target_h_px * gap)))
+            if im.mode not in ('L', 'RGB'):
+                with im.convert('RGB') as rgb:
+                    return rgb.resize((target_w_px, target_h_px), method, reducing_gap=gap)
+            return im.resize((target_w_px, target_h_px), method, reducing_gap=gap)
+    return None
+
+def encode_image(image, fp, encoding, jpeg_quality=85, jpeg_subsampling='4:2:0'):
+    """Writes a resampled PIL image to fp (a path or file object) in the given encoding."""
+    if encoding == 'jpeg':
+        image.save(fp, format='JPEG', quality=jpeg_quality, subsampling=jpeg_subsampling)
+    elif encoding == 'flate':
+        image.save(fp, format='PNG', compress_level=1)
+    else:
+        raise ValueError(f"Unknown image encoding '{encoding}'. Use 'jpeg' or 'flate'.")
+
+def fold_name(filename):
+    """A file name as case-insensitive filesystems compare it: case and Unicode normalization ignored."""
+    return unicodedata.normalize('NFC', filename).casefold()
+
+class ImageIndex:
+    """
+    The photos in a directory, listed once with os.scandir().
+
+    Looking up a portrait is then a dict lookup instead of several filesystem
+    round trips per card (slow on network shares), and the recorded size and
+    mtime spare the image cache another stat. File names in subfolders
+    ('class-a/alice.jpg') are not indexed and are checked on disk instead.
+    A name missing from the listing is also checked on disk once, since
+    case-insensitive filesystems (macOS, Windows) find "Alice.JPG" as alice.jpg,
+    and macOS matches names however their accents are normalized.
+    """
+    def __init__(self, directory, case_insensitive=False):
+        self.directory = directory
+        self.case_insensitive = case_insensitive
+        self.entries = {}   # lookup name -> (path, size, mtime_ns)
+        self.stats = {}     # path -> (size, mtime_ns)
+        self.files = []     # Paths of every file listed
+        self.probed = {}    # name missing from the listing -> path found on disk, or None
+        self.folded = None  # folded name -> path, built on the first probe that finds a file
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    path = os.path.join(directory, entry.name)
+                    self.entries.setdefault(self.normalize(entry.name), (path, st.st_size, st.st_mtime_ns))
+                    self.stats[path] = (st.st_size, st.st_mtime_ns)
+                    self.files.append(path)
+        except OSError as e:
+            print(f"Warning: Could not list photos in '{directory}': {e}")
+
+    def normalize(self, filename):
+        return filename.casefold() if self.case_insensitive else filename
+
+    def find(self, filename):
+        """Returns the path of a photo, or None if there is no such file."""
+        if '/' in filename or os.sep in filename:
+            path = os.path.join(self.directory, filename)
+            return path if os.path.isfile(path) else None
+        entry = self.entries.get(self.normalize(filename))
+        if entry:
+            return entry[0]
+        if filename not in self.probed:
+            self.probed[filename] = self.probe(filename)
+        return self.probed[filename]
+
+    def probe(self, filename):
+        """Looks for a name the listing missed on disk; returns the listed path of the file it finds."""
+        path = os.path.join(self.directory, filename)
+        if not os.path.isfile(path):
+            return None
+        if self.folded is None:
+            self.folded = {fold_name(os.path.basename(p)): p for p in self.files}
+        return self.folded.get(fold_name(filename), path)
+
+    def get_stat(self, path):
+        """Returns (size, mtime_ns) of a found photo."""
+        stat = self.stats.get(path)
+        if stat is None:
+            st = os.stat(path)
+            stat = self.stats[path] = (st.st_size, st.st_mtime_ns)
+        return stat
+
+    def get_report(self, filenames):
+        """
+        Compares the photo names participants refer to with the files on disk.
+        Returns (missing, unused): referenced names with no file, and files
+        nobody refers to (hidden files excluded). Both are sorted lists.
+        """
+        missing = set()
+        used = set()
+        for filename in filenames:
+            path = self.find(filename)
+            if path is None:
+                missing.add(filename)
+            else:
+                used.add(path)
+        unused = [
+            os.path.basename(path) for path in self.files
+            if path not in used and not os.path.basename(path).startswith('.')
+        ]
+        return sorted(missing), sorted(unused)
+
+class ImageCache:
+    """
+    On-disk cache of resampled portraits.
+
+    Entries are keyed by the content digest of the source photo and the target
+    pixel size and DPI. Editing a photo or changing the layout produces a new
+    entry, while identical photos stored under different names share one entry.
+    Draft thumbnails (draft=True) get keys of their own.
+    Each entry is a single file in 'directory'. Hits refresh the file's mtime,
+    and save() evicts the least recently used entries once the cache grows
+    beyond max_bytes.
+    The cache is picklable, so it can be handed to process pool workers, and
+    fetch() may be called from several threads at once.
+    hits and misses count the lookups made by get() in this process.
+    """
+    def __init__(self, directory, max_bytes, encoding='flate', jpeg_quality=85, jpeg_subsampling='4:2:0', draft=False):
+        if encoding not in ENCODING_SUFFIXES:
+            raise ValueError(f"Unknown image encoding '{encoding}'. Use 'jpeg' or 'flate'.")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.encoding = encoding
+        self.jpeg_quality = jpeg_quality
+        self.jpeg_subsampling = jpeg_subsampling
+        self.draft = draft
+        self.suffix = ENCODING_SUFFIXES[encoding]
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self.digests = {}
+        self.digests_changed = False
+        self.used_digests = set()  # Stat keys looked up by this run
+        try:
+            with open(os.path.join(directory, DIGEST_INDEX), 'r', encoding='utf-8') as f:
+                self.digests = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def __getstate__(self):
+        # Workers are handed precomputed keys, so the digest index stays in the parent
+        state = dict(vars(self))
+        state['digests'] = {}
+        state['used_digests'] = set()
+        return state
+
+    def get_digest(self, img_path, stat=None):
+        """
+        Returns the content digest of img_path, reading the file only if it changed.
+        stat is the file's (size, mtime_ns) if already known, e.g. from an ImageIndex.
+        """
+        if stat is None:
+            st = os.stat(img_path)
+            stat = (st.st_size, st.st_mtime_ns)
+        stat_key = f"{os.path.abspath(img_path)}|{stat[0]}|{stat[1]}"
+        self.used_digests.add(stat_key)
+        digest = self.digests.get(stat_key)
+        if digest is None:
+            digest = utils.get_file_digest(img_path)
+            self.digests[stat_key] = digest
+            self.digests_changed = True
+        return digest
+
+    def make_key(self, img_path, target_w_px, target_h_px, dpi, stat=None):
+        raw = f"{self.get_digest(img_path, stat)}|{target_w_px}x{target_h_px}|{dpi}"
+        if self.encoding == 'jpeg':
+            raw += f"|jpeg|{self.jpeg_quality}|{self.jpeg_subsampling}"
+        if self.draft:
+            raw += "|draft"  # Thumbnails never stand in for full-quality entries
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns (hit, cached_path). cached_path is None when the entry says
+        the original file should be used.
+        """
+        for suffix in (self.suffix, ORIGINAL_MARKER):
+            path = os.path.join(self.directory, key + suffix)
+            try:
+                os.utime(path)
+            except OSError:
+                continue
+            self.hits += 1
+            return True, (path if suffix == self.suffix else None)
+        self.misses += 1
+        return False, None
+
+    def fetch(self, key, img_path, target_w_px, target_h_px):
+        """
+        Returns the cached path for key (None if the original should be used),
+        resampling img_path and storing it on a miss.
+        """
+        hit, cached_path = self.get(key)
+        if not hit:
+            image = resample_image(img_path, target_w_px, target_h_px, self.draft)
+            try:
+                cached_path = self.put(key, image)
+            finally:
+                if image is not None:
+                    image.close()  # Release the pixel buffer now rather than at the next GC
+        return cached_path
+
+    def put(self, key, image):
+        """
+        Stores a resampled PIL image (or None for 'use the original') and
+        returns the cached path (None for the original marker).
+        """
+        if image is None:
+            path = os.path.join(self.directory, key + ORIGINAL_MARKER)
+            open(path, 'wb').close()
+            return None
+
+        path = os.path.join(self.directory, key + self.suffix)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            encode_image(image, f, self.encoding, self.jpeg_quality, self.jpeg_subsampling)
+        os.replace(tmp_path, path)
+        return path
+
+    def save(self, index=None):
+        """
+        Writes the digest index and evicts old entries. index is the run's
+        ImageIndex, used to forget digests of photos deleted or changed since.
+        """
+        self.prune_digests(index)
+        if self.digests_changed:
+            path = os.path.join(self.directory, DIGEST_INDEX)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.digests, f)
+            os.replace(tmp_path, path)
+            self.digests_changed = False
+        self.prune()
+
+    def prune_digests(self, index=None):
+        """
+        Forgets outdated digests, so the index doesn't keep growing, without
+        touching the filesystem: for photos directly in the index's directory,
+        those not matching the size and mtime it listed; elsewhere, all but the
+        newest digest of each path. Above MAX_DIGESTS, the oldest digests this
+        run didn't use go too.
+        """
+        listed_dir = os.path.abspath(index.directory) if index else None
+        listed = {os.path.abspath(path): stat for path, stat in index.stats.items()} if index else {}
+        newest = {}
+        outdated = []
+        for stat_key in self.digests:
+            try:
+                path, size, mtime_ns = stat_key.rsplit('|', 2)
+                stat = (int(size), int(mtime_ns))
+            except ValueError:
+                outdated.append(stat_key)
+                continue
+            if os.path.dirname(path) == listed_dir:
+                if listed.get(path) != stat:
+                    outdated.append(stat_key)
+            else:
+                if path in newest:
+                    outdated.append(newest[path])  # Digests are added in order, so the later one is newer
+                newest[path] = stat_key
+
+        excess = len(self.digests) - len(outdated) - MAX_DIGESTS
+        if excess > 0:
+            outdated = set(outdated)
+            for stat_key in self.digests:
+                if excess <= 0:
+                    break
+                if stat_key not in outdated and stat_key not in self.used_digests:
+                    outdated.add(stat_key)
+                    excess -= 1
+
+        for stat_key in outdated:
+            del self.digests[stat_key]
+            self.digests_changed = True
+
+    def prune(self):
+        """
+        Deletes least recently used entries until the cache fits in max_bytes,
+        and temporary files left behind by crashed runs. Only files named like
+        the cache's own (see ENTRY_NAME and TMP_NAME) are touched.
+        """
+        entries = []
+        total = 0
+        stale_before = time.time() - STALE_TMP_SECONDS
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                is_entry = ENTRY_NAME.fullmatch(entry.name)
+                if not (is_entry or TMP_NAME.fullmatch(entry.name)) or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue  # Removed by another generator sharing the cache
+                if is_entry:
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+                elif st.st_mtime < stale_before:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def cache_image(cache, key, img_path, target_w_px, target_h_px):
+    """
+    Process pool entry point: resamples one portrait into the given ImageCache.
+    Returns (path to embed, seconds taken, size of that file in bytes or None).
+    Falls back to the original file on errors.
+    """
+    start = time.perf_counter()
+    try:
+        source = cache.fetch(key, img_path, target_w_px, target_h_px) or img_path
+    except Exception:
+        source = img_path
+    seconds = time.perf_counter() - start
+    try:
+        return source, seconds, os.path.getsize(source)
+    except OSError:
+        return source, seconds, None
@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import threading
+
+# Build manifest for incremental regeneration.
+# Records a fingerprint of what the last build was made from (participants, their
+# photos, the layout and config) and the PDF it wrote, so an unchanged roster is
+# not rendered again.
+
+MANIFEST_VERSION = 2
+
+def get_participant_hash(participant, img_path=None, img_stat=None):
+    """
+    Hashes a participant's data and, if it has one, its photo's size and mtime.
+    img_stat is the photo's (size, mtime_ns) if already known.
+    """
+    h = hashlib.sha256(json.dumps(participant, sort_keys=True, default=str).encode('utf-8'))
+    if img_path:
+        if img_stat is None:
+            st = os.stat(img_path)
+            img_stat = (st.st_size, st.st_mtime_ns)
+        h.update(f"{img_path}|{img_stat[0]}|{img_stat[1]}".encode('utf-8'))
+    return h.hexdigest()
+
+def get_build_fingerprint(layout_fingerprint, participant_hashes, resolved_meta_info):
+    """
+    Combines everything the output depends on. resolved_meta_info is the list of
+    meta_info items with their date tokens resolved, so a new day triggers a
+    rebuild of 'Last updated' dates.
+    """
+    h = hashlib.sha256(layout_fingerprint.encode('utf-8'))
+    for participant_hash in participant_hashes:
+        h.update(participant_hash.encode('utf-8'))
+    h.update(json.dumps(resolved_meta_info, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+def build_manifest(fingerprint, output_path):
+    st = os.stat(output_path)
+    return {
+        'version': MANIFEST_VERSION,
+        'fingerprint': fingerprint,
+        'output': {'path': output_path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    }
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def save_manifest(manifest, path):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+def is_up_to_date(manifest, fingerprint, output_path):
+    """True if the last build used the same inputs and its output is still untouched."""
+    if not manifest or manifest['fingerprint'] != fingerprint:
+        return False
+
+    output = manifest['output']
+    if output['path'] != output_path:
+        return False
+    try:
+        st = os.stat(output_path)
+    except OSError:
+        return False
+    return st.st_size == output['size'] and st.st_mtime_ns == output['mtime_ns']
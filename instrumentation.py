@@ -0,0 +1,157 @@
+import sys
+import csv
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:  # Windows
+    HAS_RESOURCE = False
+
+# Timers and counters for one PDFGenerator run, so a slow run shows where the
+# time went (fonts, layout, photos, drawing, saving) instead of only its total.
+#
+# Phases (seconds):
+#   fonts, layout, images (IMAGE_WORKERS pool), draw, save, render (streamed runs:
+#   layout and drawing interleaved). Batch mode adds 'load' (reading the roster).
+#   layout_text, layout_tables and image_resample are parts of the phases above:
+#   text wrapping and table measuring, and the time spent loading photos while
+#   drawing.
+#
+# Callbacks are called as callback(event, name, value):
+#   ('phase', phase_name, seconds)       when a phase ends
+#   ('page', page_number, cards_drawn)   when a page is finished
+#   ('image', img_path, photo_record)    when a photo has been loaded or resampled
+
+def get_peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be read."""
+    if not HAS_RESOURCE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class RunStats:
+    """
+    Collects phase timers, counters, per-photo records and cache hit rates.
+    Safe to update from the photo prefetch threads.
+    """
+    def __init__(self):
+        self.phases = {}      # phase -> seconds
+        self.counters = {}    # name -> count
+        self.photos = {}      # img_path -> {'cards', 'seconds', 'original_bytes', 'embedded_bytes'}
+        self.caches = {}      # cache name -> {'hits', 'misses'}
+        # Filled in by utils.get_card_metrics() on the main thread; see add_layout_timings()
+        self.layout_timings = {}
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    def add_callback(self, callback):
+        """Registers callback(event, name, value); see the top of instrumentation.py."""
+        self.callbacks.append(callback)
+
+    def emit(self, event, name, value):
+        for callback in self.callbacks:
+            callback(event, name, value)
+
+    def add_time(self, phase, seconds):
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Times the enclosed block as 'name' (added up if the phase runs more than once)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.add_time(name, seconds)
+            self.emit('phase', name, seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_photo(self, img_path, seconds, original_bytes, embedded_bytes):
+        """Records a photo that was loaded (and resampled if needed) in 'seconds'."""
+        record = {
+            'cards': 0,
+            'seconds': round(seconds, 6),
+            'original_bytes': original_bytes,
+            'embedded_bytes': embedded_bytes
+        }
+        with self.lock:
+            self.photos[img_path] = record
+            self.phases['image_resample'] = self.phases.get('image_resample', 0) + seconds
+        self.emit('image', img_path, record)
+
+    def count_photo_card(self, img_path):
+        """Counts one more card showing img_path."""
+        with self.lock:
+            record = self.photos.get(img_path)
+            if record is not None:
+                record['cards'] += 1
+
+    def add_layout_timings(self):
+        """Moves the text and table measuring times into the phase timers."""
+        for name, seconds in self.layout_timings.items():
+            self.add_time(name, seconds)
+        self.layout_timings.clear()
+
+    def set_cache(self, name, hits, misses):
+        self.caches[name] = {'hits': hits, 'misses': misses}
+
+    def as_dict(self):
+        """Returns everything collected as plain, JSON-serializable data."""
+        caches = {}
+        for name, c in self.caches.items():
+            total = c['hits'] + c['misses']
+            caches[name] = dict(c, hit_rate=round(c['hits'] / total, 4) if total else None)
+        return {
+            'phases': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            'counters': dict(self.counters),
+            'caches': caches,
+            'photos': {img_path: dict(record) for img_path, record in self.photos.items()},
+            'peak_rss_mb': get_peak_rss_mb()
+        }
+
+def write_stats(stats, path):
+    """
+    Writes one run's stats (a RunStats.as_dict() dict), or a dict of them keyed
+    by job name, to path: JSON, or CSV if path ends in .csv.
+    """
+    if not path.lower().endswith('.csv'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+        return
+
+    runs = stats if 'phases' not in stats else {'': stats}
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['job', 'section', 'name', 'value'])
+        for job, run in runs.items():
+            for section in ('phases', 'counters'):
+                for name, value in run[section].items():
+                    writer.writerow([job, section, name, value])
+            for name, c in run['caches'].items():
+                writer.writerow([job, 'caches', f"{name}_hit_rate", c['hit_rate']])
+            for img_path, record in run['photos'].items():
+                for field, value in record.items():
+                    writer.writerow([job, 'photos', f"{img_path}:{field}", value])
+            writer.writerow([job, 'memory', 'peak_rss_mb', run['peak_rss_mb']])
+
+def print_stats(stats):
+    """Prints the phase timers, counters and cache hit rates of one run."""
+    for name, seconds in sorted(stats['phases'].items(), key=lambda item: -item[1]):
+        print(f"  {name:<16}{seconds:>9.3f}s")
+    for name, value in stats['counters'].items():
+        print(f"  {name:<16}{value:>9}")
+    for name, c in stats['caches'].items():
+        if c['hit_rate'] is not None:
+            print(f"  {name + ' cache':<16}{c['hit_rate']:>9.0%} hits")
+    if stats['peak_rss_mb'] is not None:
+        print(f"  {'peak memory':<16}{stats['peak_rss_mb']:>7.1f}MB")
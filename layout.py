@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+import threading
+from itertools import islice
+
+# Layout engine: decides where every card goes before anything is drawn.
+# The result is a plan that only holds numbers (page, x, y, heights), so it can
+# be saved as JSON and reused to render any page range without measuring again.
+
+PLAN_VERSION = 1
+
+def get_card_height(metrics):
+    """Total height of a card from its get_card_metrics() layout."""
+    total = metrics['non_table_height']
+    if metrics['table_height'] > 0:
+        total += metrics['table_top_margin'] + metrics['table_height']
+    return total + metrics['img_border_width']
+
+def get_row_heights(row_metrics, cfg):
+    """
+    Returns (max_row_height, alignment_height) for a row of card layouts.
+    alignment_height is None unless ALIGN_TABLES_ROW is enabled.
+    """
+    max_row_height = 0
+    alignment_height = None
+
+    # Check if alignment is enabled in config
+    if hasattr(cfg, 'ALIGN_TABLES_ROW') and cfg.ALIGN_TABLES_ROW:
+        # 1. Find the maximum non-table height (image + text) in this row
+        #    This defines the common starting line for all tables.
+        max_non_table_height = 0
+        for m in row_metrics:
+            if m['non_table_height'] > max_non_table_height:
+                max_non_table_height = m['non_table_height']
+
+        alignment_height = max_non_table_height
+
+        # 2. Calculate the effective total height for each card based on this aligned start
+        final_card_heights = []
+        for m in row_metrics:
+            # Even if a card has short text, its effective height is determined by the
+            # aligned table start position + its own table height.
+            card_h = alignment_height
+            if m['table_height'] > 0:
+                card_h += m['table_top_margin'] + m['table_height']
+            card_h += m['img_border_width']
+            final_card_heights.append(card_h)
+
+        max_row_height = max(final_card_heights) if final_card_heights else 0
+
+    else:
+        # Standard behavior: simple max of individual totals
+        total_heights = [get_card_height(m) for m in row_metrics]
+        max_row_height = max(total_heights) if total_heights else 0
+
+    return max_row_height, alignment_height
+
+def iter_rows(participants, columns):
+    """
+    Yields rows of (participant_index, participant) pairs, pulling 'columns'
+    participants at a time, so 'participants' can be any iterable (even a stream).
+    """
+    indexed = enumerate(participants)
+    while True:
+        row = list(islice(indexed, columns))
+        if not row:
+            return
+        yield row
+
+def pack_rows(measured_rows, columns, group_key=None):
+    """
+    Regroups measured cards into rows of similar height, so a tall card no
+    longer stretches a row of short ones. Cards are sorted tallest first (equal
+    heights keep their input order) and cut into rows of 'columns'.
+    With group_key, only participants with the same value for that key share a
+    row, and groups keep the order in which they first appear.
+
+    Returns a list of (row, row_metrics), like the rows passed in.
+    """
+    groups = {}
+    for row, row_metrics in measured_rows:
+        for (index, participant), metrics in zip(row, row_metrics):
+            group = participant.get(group_key) if group_key else None
+            groups.setdefault(group, []).append((get_card_height(metrics), index, participant, metrics))
+
+    packed = []
+    for cards in groups.values():
+        cards.sort(key=lambda card: (-card[0], card[1]))
+        for i in range(0, len(cards), columns):
+            chunk = cards[i:i + columns]
+            packed.append((
+                [(index, participant) for _, index, participant, _ in chunk],
+                [metrics for _, _, _, metrics in chunk]
+            ))
+    return packed
+
+def count_pages(measured_rows, cfg, start_y):
+    """Number of pages the rows take when placed in the given order."""
+    page_count = 1
+    for card, _, _ in iter_placements(measured_rows, cfg, start_y):
+        page_count = card['page']
+    return page_count
+
+def iter_placements(measured_rows, cfg, start_y):
+    """
+    Places measured rows on pages as they arrive.
+
+    Args:
+        measured_rows: Iterable of (row, row_metrics), where row is a list of
+            (participant_index, participant) pairs.
+        cfg: The generator's configuration.
+        start_y (float): Top of the content area on the first page (below the header).
+
+    Yields:
+        (card, participant, metrics) for every card, in order. card holds the
+        plan entry: index, page, x, y, row_height and alignment_height.
+    """
+    page_number = 1
+    cursor_y = start_y
+
+    for row, row_metrics in measured_rows:
+        max_row_height, alignment_height = get_row_heights(row_metrics, cfg)
+
+        # Check for page break
+        if (cursor_y - max_row_height) < cfg.MARGIN_BOTTOM:
+            page_number += 1
+            cursor_y = cfg.PAGE_HEIGHT - cfg.MARGIN_TOP
+
+        current_x = cfg.MARGIN_LEFT
+        for (index, participant), metrics in zip(row, row_metrics):
+            card = {
+                'index': index,
+                'page': page_number,
+                'x': current_x,
+                'y': cursor_y,
+                'row_height': max_row_height,
+                'alignment_height': alignment_height
+            }
+            yield card, participant, metrics
+            current_x += cfg.COL_WIDTH + cfg.GRID_GAP_X
+
+        cursor_y -= (max_row_height + cfg.GRID_GAP_Y)
+
+def paginate(measured_rows, cfg, start_y):
+    """
+    Places measured rows on pages (see iter_placements()).
+
+    Returns:
+        (plan, layouts): the JSON-serializable plan, and a dict mapping
+        participant index -> layout from utils.get_card_metrics().
+    """
+    cards = []
+    layouts = {}
+    for card, _, metrics in iter_placements(measured_rows, cfg, start_y):
+        cards.append(card)
+        layouts[card['index']] = metrics
+
+    plan = {
+        'version': PLAN_VERSION,
+        'page_count': cards[-1]['page'] if cards else 1,
+        'cards': cards
+    }
+    return plan, layouts
+
+def get_fingerprint(participants, header_items, cfg):
+    """
+    Returns a hash of everything the layout depends on: the roster, the header,
+    the configuration and the font files. A cached plan is only valid for the
+    same fingerprint.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(participants, sort_keys=True, default=str).encode('utf-8'))
+    h.update(json.dumps(header_items, sort_keys=True, default=str).encode('utf-8'))
+    h.update(repr(sorted(cfg.as_dict().items())).encode('utf-8'))
+    for path in (cfg.FONT_PATH_REGULAR, cfg.FONT_PATH_BOLD):
+        try:
+            st = os.stat(path)
+            h.update(f"{path}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8'))
+        except OSError:
+            h.update(f"{path}|missing".encode('utf-8'))
+    return h.hexdigest()
+
+def save_plan(plan, path):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+    os.replace(tmp_path, path)
+
+def load_plan(path, fingerprint=None):
+    """
+    Loads a saved plan. Returns None if there is none, or if it was made
+    for different inputs than 'fingerprint'.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if plan.get('version') != PLAN_VERSION:
+        return None
+    if fingerprint is not None and plan.get('fingerprint') != fingerprint:
+        return None
+    return plan
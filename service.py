@@ -0,0 +1,270 @@
+import os
+import re
+import json
+import time
+import queue
+import argparse
+import threading
+from io import BytesIO
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from reportlab.lib.pagesizes import landscape, A4
+from generator import PDFGenerator
+from batch import load_data, resolve_colors, build_meta_info
+
+# Long-running local rendering service. Fonts, the image cache and the text
+# measurement caches stay loaded between requests, so regenerating a small
+# roster takes a fraction of a second instead of a cold start.
+#
+# Usage:
+#   python service.py                          # http://127.0.0.1:8765
+#   python service.py --port 9000 --workers 2 --queue-size 16
+#
+# POST /render with a JSON job, answered with the PDF:
+# {
+#     "participants": [ ...participants, as in the data files... ],   # Or "input": file in data/
+#     "output": "gallery.pdf",                   # Optional: file name suggested to the client
+#     "top_right_text": "In-person & Old student",
+#     "landscape": false,
+#     "pages": [1, 2],                           # Optional: only render these pages
+#     "custom_config": { ...layout and style overrides, see REQUEST_SETTINGS... }
+# }
+#   curl -H "Content-Type: application/json" --data @job.json http://127.0.0.1:8765/render -o gallery.pdf
+#
+# Jobs must be sent as application/json. Settings that name files or tune the
+# process (fonts, caches, stats files...) can't be overridden per request; set
+# them in config.py or the --config file instead.
+#
+# GET /health reports the number of queued jobs. When the queue is full,
+# /render answers 503 straight away; retry later.
+
+CHUNK_SIZE = 64 * 1024  # Bytes written to the client at a time
+MAX_REQUEST_BYTES = 32 * 1024 * 1024  # Larger jobs are answered 413
+DEFAULT_OUTPUT = 'gallery.pdf'
+
+# Settings a request's custom_config may override: layout and style only
+REQUEST_SETTINGS = frozenset({
+    'MARGIN_TOP', 'MARGIN_BOTTOM', 'MARGIN_LEFT', 'MARGIN_RIGHT',
+    'COLUMNS', 'IMG_ASPECT_RATIO', 'IMG_BORDER_WIDTH', 'GRID_GAP_X', 'GRID_GAP_Y',
+    'TEXT_GAP_BUFFER', 'TABLE_TOP_MARGIN', 'ALIGN_TABLES_ROW', 'ROW_PACKING', 'ROW_PACKING_KEY',
+    'TABLE_OPTS', 'TABLE_RENDERER', 'PARTICIPANT_STYLE', 'DEFAULT_HEADER_STYLE', 'DRAFT_MODE',
+})
+
+# A file name in data/: no folders, no hidden files
+INPUT_NAME = re.compile(r'[\w\-][\w\-. ]*\.jsonl?')
+
+def is_photo_name(name):
+    """True if a 'potrait' value stays inside IMG_DIR: a relative path without '..' or a drive."""
+    parts = re.split(r'[\\/]', name)
+    return not (os.path.isabs(name) or name.startswith(('/', '\\')) or ':' in name or '..' in parts)
+
+# Types of the header_info item fields a request may set
+HEADER_FIELD_TYPES = {'text': str, 'font': str, 'align': str, 'color': str, 'size': (int, float), 'bottom_padding': (int, float)}
+
+def is_page_list(value):
+    """True for a list of page numbers (whole numbers from 1)."""
+    return isinstance(value, list) and all(isinstance(n, int) and not isinstance(n, bool) and n >= 1 for n in value)
+
+def validate_job(job):
+    """
+    Raises ValueError if a job sent over HTTP asks for more than a render, or
+    has fields of the wrong type (which would otherwise fail halfway through rendering).
+    """
+    if not isinstance(job, dict) or ('participants' not in job and 'input' not in job):
+        raise ValueError("The job needs 'participants' or 'input'.")
+    if 'participants' in job:
+        if not isinstance(job['participants'], list):
+            raise ValueError("'participants' must be a list.")
+        for participant in job['participants']:
+            if not isinstance(participant, dict):
+                raise ValueError("Each participant must be an object.")
+            photo = participant.get('potrait')
+            if photo is not None and not isinstance(photo, str):
+                raise ValueError("'potrait' must be a file name.")
+            if photo and not is_photo_name(photo):
+                raise ValueError("'potrait' must be a file name in the photo folder.")
+    elif not isinstance(job['input'], str) or not INPUT_NAME.fullmatch(job['input']):
+        raise ValueError("'input' must be the name of a .json or .jsonl file in data/.")
+
+    if job.get('pages') is not None and not is_page_list(job['pages']):
+        raise ValueError("'pages' must be a list of page numbers (from 1).")
+    if not isinstance(job.get('top_right_text', ''), str):
+        raise ValueError("'top_right_text' must be a string.")
+    if not isinstance(job.get('landscape', False), bool):
+        raise ValueError("'landscape' must be true or false.")
+    header_info = job.get('header_info', [])
+    if not isinstance(header_info, list) or not all(isinstance(item, dict) for item in header_info):
+        raise ValueError("'header_info' must be a list of objects.")
+    for item in header_info:
+        for field, types in HEADER_FIELD_TYPES.items():
+            if field in item and (isinstance(item[field], bool) or not isinstance(item[field], types)):
+                raise ValueError(f"header_info '{field}' has the wrong type.")
+
+    custom_config = job.get('custom_config') or {}
+    if not isinstance(custom_config, dict):
+        raise ValueError("'custom_config' must be an object.")
+    refused = sorted(name for name in custom_config if name not in REQUEST_SETTINGS)
+    if refused:
+        raise ValueError(f"These settings can't be set per request: {', '.join(refused)}.")
+
+def get_download_name(output):
+    """File name for Content-Disposition: printable ASCII only, without quotes, backslashes or folders."""
+    if not isinstance(output, str):
+        return DEFAULT_OUTPUT
+    name = ''.join(c for c in output if c.isascii() and c.isprintable() and c not in '"\\')
+    name = name.rsplit('/', 1)[-1].strip()
+    return name if name.strip('.') else DEFAULT_OUTPUT
+
+class RenderService:
+    """
+    A bounded job queue served by a pool of worker threads. Each job renders
+    into memory and hands the PDF bytes back through a Future.
+    """
+    def __init__(self, workers=1, queue_size=8, shared_config=None):
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.shared_config = shared_config or {}
+        self.threads = [
+            threading.Thread(target=self.work, name=f"render-{i + 1}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, job):
+        """Queues a job and returns a Future of (pdf_bytes, stats). Raises queue.Full if the queue is full."""
+        future = Future()
+        self.jobs.put_nowait((job, future))
+        return future
+
+    def work(self):
+        while True:
+            job, future = self.jobs.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    future.set_result(self.render(job))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.jobs.task_done()
+
+    def render(self, job):
+        """Renders one job into memory. Returns (pdf_bytes, stats)."""
+        custom_config = dict(self.shared_config)
+        custom_config.update(job.get('custom_config') or {})
+        # Photos are served from the warm image cache; a process pool per request costs more than it saves
+        custom_config.setdefault('IMAGE_WORKERS', 1)
+
+        participants = job.get('participants')
+        if participants is None:
+            participants = load_data(job['input'])
+
+        buf = BytesIO()
+        pdf_gen = PDFGenerator(
+            buf,
+            landscape(A4) if job.get('landscape') else A4,
+            job.get('header_info', []),
+            participants,
+            build_meta_info(job.get('top_right_text', '')),
+            custom_config=resolve_colors(custom_config)
+        )
+        pdf_gen.generate(pages=job.get('pages'))
+        return buf.getvalue(), pdf_gen.stats.as_dict()
+
+class RequestHandler(BaseHTTPRequestHandler):
+    # Set on the handler class by serve()
+    service = None
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json(404, {'error': 'Not found'})
+        self.send_json(200, {'status': 'ok', 'queued': self.service.jobs.qsize()})
+
+    def do_POST(self):
+        if self.path != '/render':
+            return self.send_json(404, {'error': 'Not found'})
+
+        start = time.perf_counter()
+        # Browsers can't send application/json cross-site without a CORS preflight
+        if self.headers.get_content_type() != 'application/json':
+            return self.send_json(415, {'error': 'Send the job as application/json'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            return self.send_json(400, {'error': 'Invalid Content-Length'})
+        if length > MAX_REQUEST_BYTES:
+            return self.send_json(413, {'error': 'Job too large'})
+        try:
+            job = json.loads(self.rfile.read(length))
+            validate_job(job)
+        except ValueError as e:
+            return self.send_json(400, {'error': f"Invalid job: {e}"})
+
+        try:
+            future = self.service.submit(job)
+        except queue.Full:
+            return self.send_json(503, {'error': 'Too many jobs queued'}, {'Retry-After': '5'})
+
+        try:
+            pdf, stats = future.result()
+        except OSError:
+            # The message would name files on this machine
+            return self.send_json(400, {'error': "Could not read the job's input"})
+        except (ValueError, KeyError) as e:
+            return self.send_json(400, {'error': f"{type(e).__name__}: {e}"})
+        except Exception as e:
+            self.log_error("Render failed: %s: %s", type(e).__name__, e)
+            return self.send_json(500, {'error': 'Render failed'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(pdf)))
+        self.send_header('Content-Disposition', f'attachment; filename="{get_download_name(job.get("output"))}"')
+        self.send_header('X-Render-Seconds', f"{time.perf_counter() - start:.3f}")
+        self.send_header('X-Pages', str(stats['counters'].get('pages', 0)))
+        self.end_headers()
+        view = memoryview(pdf)
+        for i in range(0, len(view), CHUNK_SIZE):
+            self.wfile.write(view[i:i + CHUNK_SIZE])
+
+def serve(host='127.0.0.1', port=8765, workers=1, queue_size=8, shared_config=None):
+    """Runs the service until interrupted."""
+    RequestHandler.service = RenderService(workers, queue_size, shared_config)
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    print(f"Rendering service listening on http://{host}:{port} ({workers} worker(s), queue of {queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve participant gallery renders over HTTP on this machine.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1, local only)")
+    parser.add_argument('--port', type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument('--workers', type=int, default=1, help="Jobs rendered at the same time (default: 1)")
+    parser.add_argument('--queue-size', type=int, default=8,
+                        help="Jobs that may wait for a worker before requests are turned away (default: 8)")
+    parser.add_argument('--config', metavar='FILE', help="JSON file of overrides applied to every job")
+    args = parser.parse_args()
+
+    shared_config = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            shared_config = json.load(f)
+    serve(args.host, args.port, args.workers, args.queue_size, shared_config)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import copy
+import difflib
+from types import MappingProxyType
+from reportlab import rl_config
+from reportlab.platypus import TableStyle
+import config  # We import this ONLY to read defaults
+import images
+import utils
+
+# Compiled, read-only settings for one PDFGenerator run.
+# Overrides are checked once up front, and everything the hot paths used to
+# re-derive for every card (image height, column widths, leadings, the table
+# style, image pixel sizes) is computed here once.
+
+# We assume all UPPERCASE variables in config.py are settings.
+SETTING_NAMES = tuple(k for k in vars(config) if k.isupper())
+
+# Values derived from the settings
+DERIVED_NAMES = (
+    'IMG_HEIGHT',          # Portrait height: COL_WIDTH / IMG_ASPECT_RATIO
+    'TEXT_WIDTH',          # Width participant text is wrapped to
+    'TEXT_GAP',            # Gap between the photo and the first text line
+    'FIELD_STYLES',        # PARTICIPANT_STYLE fields, each with its 'leading' added
+    'TABLE_KEY_WIDTH',     # Width of the table's key column
+    'TABLE_VALUE_WIDTH',   # Width of the table's value column
+    'TABLE_LEADING',       # Distance between table text lines
+    'TABLE_STYLE',         # TableStyle used by the 'platypus' table renderer
+    'IMAGE_TARGET_SIZE',   # (width, height) in pixels photos are resampled to (DRAFT_DPI in draft mode)
+)
+
+# Settings kept as process globals (by ReportLab, or shared caches): applied once by
+# apply_process_settings(), they can only be changed in config.py, not per generator.
+PROCESS_SETTINGS = (
+    'BINARY_IMAGE_STREAMS',  # rl_config.useA85, read when images and pages are written
+    'TEXT_CACHE_SIZE',       # Size of the text measurement caches in utils.py
+)
+
+# Nested style settings, stored as read-only mappings (lists become tuples)
+FROZEN_NAMES = ('TABLE_OPTS', 'PARTICIPANT_STYLE', 'DEFAULT_HEADER_STYLE', 'FIELD_STYLES')
+
+REQUIRED_TABLE_OPTS = ('key_col_ratio', 'font', 'size', 'text_color', 'border_color', 'border_width', 'padding')
+REQUIRED_FIELD_KEYS = ('key', 'label', 'font', 'size', 'color', 'padding')
+
+def get_defaults():
+    """Returns a dict of every setting's default value from config.py."""
+    return {k: getattr(config, k) for k in SETTING_NAMES}
+
+def merge_overrides(custom_config=None):
+    """
+    Returns the defaults with custom_config applied, as a deep copy: nested
+    styles are never shared with config.py, custom_config or other generators.
+    Raises ValueError for names config.py doesn't define, which are usually typos.
+    """
+    values = get_defaults()
+    for name in (custom_config or {}):
+        if name not in values:
+            hint = difflib.get_close_matches(name, SETTING_NAMES, n=1)
+            suggestion = f" Did you mean '{hint[0]}'?" if hint else ""
+            raise ValueError(f"Unknown setting '{name}' in custom_config.{suggestion}")
+        if name in PROCESS_SETTINGS:
+            raise ValueError(f"'{name}' applies to the whole process; set it in config.py instead of custom_config.")
+    values.update(custom_config or {})
+    return copy.deepcopy(values)
+
+def apply_process_settings():
+    """Applies the PROCESS_SETTINGS from config.py to this process."""
+    # ASCII85 only makes image streams larger
+    rl_config.useA85 = 0 if config.BINARY_IMAGE_STREAMS else 1
+    utils.set_text_cache_size(config.TEXT_CACHE_SIZE)
+
+def replace_fonts(values, replacements):
+    """
+    Points every style in 'values' that uses a font in 'replacements'
+    (name -> new name) at the new name, e.g. after a font failed to load.
+    """
+    def swap(style):
+        if style.get('font') in replacements:
+            style['font'] = replacements[style['font']]
+
+    for field in values['PARTICIPANT_STYLE']:
+        swap(field)
+    swap(values['TABLE_OPTS'])
+    swap(values['DEFAULT_HEADER_STYLE'])
+
+def validate(values):
+    """Raises ValueError if a setting has a value the generator can't work with."""
+    if not isinstance(values['COLUMNS'], int) or values['COLUMNS'] < 1:
+        raise ValueError(f"COLUMNS must be a whole number of at least 1, not {values['COLUMNS']!r}.")
+    if values['IMG_ASPECT_RATIO'] <= 0:
+        raise ValueError("IMG_ASPECT_RATIO must be greater than 0.")
+    if values['TABLE_RENDERER'] not in ('direct', 'platypus'):
+        raise ValueError(f"Unknown TABLE_RENDERER '{values['TABLE_RENDERER']}'. Use 'direct' or 'platypus'.")
+    if values['DRAFT_MODE'] and values['DRAFT_DPI'] <= 0:
+        raise ValueError("DRAFT_DPI must be greater than 0.")
+    if values['IMAGE_ENCODING'] not in images.ENCODING_SUFFIXES:
+        raise ValueError(f"Unknown image encoding '{values['IMAGE_ENCODING']}'. Use 'jpeg' or 'flate'.")
+
+    missing = [k for k in REQUIRED_TABLE_OPTS if k not in values['TABLE_OPTS']]
+    if missing:
+        raise ValueError(f"TABLE_OPTS is missing: {', '.join(missing)}.")
+    if not 0 < values['TABLE_OPTS']['key_col_ratio'] < 1:
+        raise ValueError("TABLE_OPTS['key_col_ratio'] must be between 0 and 1.")
+
+    if not values['PARTICIPANT_STYLE']:
+        raise ValueError("PARTICIPANT_STYLE needs at least one field.")
+    for field in values['PARTICIPANT_STYLE']:
+        missing = [k for k in REQUIRED_FIELD_KEYS if k not in field]
+        if missing:
+            raise ValueError(f"PARTICIPANT_STYLE field {field.get('key', field)!r} is missing: {', '.join(missing)}.")
+
+def freeze(value):
+    """Returns a read-only copy of a style: dicts become mappingproxies, lists tuples."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """Reverses freeze(): returns plain dicts and lists."""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+class Settings:
+    """
+    Immutable settings of one run: every config.py setting (with overrides
+    applied) plus the DERIVED_NAMES values. Read them as attributes, e.g.
+    cfg.COL_WIDTH or cfg.IMG_HEIGHT. The nested styles (FROZEN_NAMES) are
+    read-only too.
+    """
+    __slots__ = SETTING_NAMES + DERIVED_NAMES
+
+    def __init__(self, values, pagesize):
+        """
+        Args:
+            values (dict): Every setting, e.g. from merge_overrides().
+            pagesize (tuple): (width, height) of the page in points.
+        """
+        validate(values)
+        values = dict(values)
+
+        # Page size and column width depend on the layout passed in
+        values['PAGE_WIDTH'], values['PAGE_HEIGHT'] = pagesize
+        available_width = values['PAGE_WIDTH'] - values['MARGIN_LEFT'] - values['MARGIN_RIGHT']
+        total_gaps_width = (values['COLUMNS'] - 1) * values['GRID_GAP_X']
+        values['COL_WIDTH'] = (available_width - total_gaps_width) / values['COLUMNS']
+
+        for name in SETTING_NAMES:
+            object.__setattr__(self, name, values[name])
+
+        col_width = self.COL_WIDTH
+        opts = self.TABLE_OPTS
+        derived = {
+            'IMG_HEIGHT': col_width / self.IMG_ASPECT_RATIO,
+            'TEXT_WIDTH': col_width - 4,
+            'TEXT_GAP': self.PARTICIPANT_STYLE[0]['size'] + self.TEXT_GAP_BUFFER,
+            'FIELD_STYLES': tuple(
+                dict(field, leading=field['size'] * 1.2) for field in self.PARTICIPANT_STYLE
+            ),
+            'TABLE_KEY_WIDTH': col_width * opts['key_col_ratio'],
+            'TABLE_VALUE_WIDTH': col_width * (1 - opts['key_col_ratio']),
+            'TABLE_LEADING': 1.2 * opts['size'],
+            'TABLE_STYLE': TableStyle([
+                ('FONT', (0, 0), (-1, -1), opts['font'], opts['size']),
+                ('TEXTCOLOR', (0, 0), (-1, -1), opts['text_color']),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+                ('GRID', (0, 0), (-1, -1), opts['border_width'], opts['border_color']),
+                ('BOTTOMPADDING', (0, 0), (-1, -1), opts['padding']),
+                ('TOPPADDING', (0, 0), (-1, -1), opts['padding']),
+            ]),
+            'IMAGE_TARGET_SIZE': images.get_target_size(self),
+        }
+        for name, value in derived.items():
+            object.__setattr__(self, name, value)
+        for name in FROZEN_NAMES:
+            object.__setattr__(self, name, freeze(getattr(self, name)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Settings are read-only; pass overrides in custom_config instead.")
+
+    def __delattr__(self, name):
+        raise AttributeError("Settings are read-only.")
+
+    def as_dict(self):
+        """Returns the settings (without derived values) as a plain dict."""
+        values = {name: getattr(self, name) for name in SETTING_NAMES}
+        for name in FROZEN_NAMES:
+            if name in values:
+                values[name] = thaw(values[name])
+        return values
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image
+import images
+
+def make_key(i):
+    return hashlib.sha1(str(i).encode('utf-8')).hexdigest()
+
+class ImageCachePruneTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def touch(self, name, data=b'x', age=0):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if age:
+            mtime = time.time() - age
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_prune_only_touches_cache_files(self):
+        cache = images.ImageCache(self.dir, max_bytes=0, encoding='flate')
+        entries = [cache.put(make_key(i), Image.effect_noise((64, 64), 50)) for i in range(3)]
+        marker = os.path.join(self.dir, make_key(9) + images.ORIGINAL_MARKER)
+        cache.put(make_key(9), None)
+
+        # Files the cache did not write, some of them named almost like its own
+        unrelated = [
+            self.touch('photo.jpg', b'x' * 10000, age=7200),
+            self.touch('notes.txt'),
+            self.touch('backup.tmp', age=7200),
+            self.touch(make_key(5) + '.bak', age=7200),
+            self.touch(make_key(6).upper() + '.png', age=7200),
+        ]
+        stale_tmp = self.touch(f"{make_key(7)}.png.123.456.tmp", age=2 * images.STALE_TMP_SECONDS)
+        fresh_tmp = self.touch(f"{make_key(8)}.png.123.456.tmp")
+
+        cache.save()
+
+        for path in entries + [marker, stale_tmp]:
+            self.assertFalse(os.path.exists(path), path)
+        for path in unrelated + [fresh_tmp]:
+            self.assertTrue(os.path.exists(path), path)
+
+    def test_prune_evicts_least_recently_used(self):
+        cache = images.ImageCache(self.dir, max_bytes=10 ** 9, encoding='flate')
+        paths = [cache.put(make_key(i), Image.effect_noise((64, 64), 50)) for i in range(3)]
+        for age, path in zip((300, 200, 100), paths):
+            os.utime(path, (time.time() - age, time.time() - age))
+        cache.max_bytes = sum(map(os.path.getsize, paths[1:]))
+
+        cache.prune()
+
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertTrue(all(map(os.path.exists, paths[1:])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import re
+import io
+import sys
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+import config
+from generator import PDFGenerator
+
+STREAM = re.compile(rb'stream\r?\n(.*?)endstream', re.S)
+
+def make_roster(count=18):
+    """Cards with no table, short tables, wrapping keys and values, and unbreakable words."""
+    participants = []
+    for i in range(count):
+        table_data = None
+        if i % 5:
+            table_data = {
+                "Age": str(10 + i),
+                "Emergency contact name": "Parent, reachable after 6pm " * (i % 3),
+                "Room": "",
+                "Notes": "Supercalifragilisticexpialidocious" * (i % 2 + 1),
+            }
+            table_data = dict(list(table_data.items())[:i % 4 + 1])
+        participants.append({
+            "name": f"Participant {i}" + " Longname" * (i % 3),
+            "line1": "Grade 10 - Science Stream" if i % 2 else "",
+            "table_data": table_data
+        })
+    return participants
+
+class TableRendererTest(unittest.TestCase):
+    """The 'direct' table renderer must draw exactly what the 'platypus' Table draws."""
+
+    def setUp(self):
+        self.img_dir = tempfile.mkdtemp()
+        # Uncompressed, reproducible output, so page content streams can be compared
+        self.saved = (rl_config.invariant, rl_config.pageCompression)
+        rl_config.invariant = 1
+        rl_config.pageCompression = 0
+        self.participants = make_roster()
+
+    def tearDown(self):
+        rl_config.invariant, rl_config.pageCompression = self.saved
+        shutil.rmtree(self.img_dir)
+
+    def render(self, **custom_config):
+        """Returns the content streams of a render of the roster."""
+        custom_config.update(IMG_DIR=self.img_dir, ENABLE_IMAGE_CACHE=False)
+        buf = io.BytesIO()
+        with contextlib.redirect_stdout(io.StringIO()):  # Font fallback warnings
+            PDFGenerator(buf, A4, [], self.participants, [], custom_config=custom_config).generate()
+        return STREAM.findall(buf.getvalue())
+
+    def assert_renderers_match(self, **custom_config):
+        direct = self.render(TABLE_RENDERER='direct', **custom_config)
+        platypus = self.render(TABLE_RENDERER='platypus', **custom_config)
+        self.assertTrue(direct)
+        self.assertEqual(direct, platypus)
+
+    def test_default_table_opts(self):
+        self.assert_renderers_match()
+
+    def test_no_border_or_padding(self):
+        self.assert_renderers_match(TABLE_OPTS=dict(config.TABLE_OPTS, border_width=0, padding=0))
+
+    def test_aligned_rows(self):
+        self.assert_renderers_match(ALIGN_TABLES_ROW=True)
+
+    def test_other_columns_and_sizes(self):
+        self.assert_renderers_match(COLUMNS=3, TABLE_OPTS=dict(config.TABLE_OPTS, size=8, key_col_ratio=0.3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils
+
+class LoadParticipantsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, text, name='roster.json'):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_chunk_boundaries(self):
+        participants = [{"name": f"Person {i}", "age": i * 7, "table_data": {"Diet": "None"}} for i in range(20)]
+        path = self.write(' [\n' + ' ,\n'.join(json.dumps(p) for p in participants) + '\n]\n')
+        # Every chunk size splits values, separators and numbers at different places
+        for chunk_size in range(1, 40):
+            self.assertEqual(list(utils.load_participants(path, chunk_size)), participants)
+
+    def test_numbers_split_across_reads(self):
+        path = self.write('[12345, 678]')
+        for chunk_size in range(1, 12):
+            self.assertEqual(list(utils.load_participants(path, chunk_size)), [12345, 678])
+
+    def test_empty_array(self):
+        self.assertEqual(list(utils.load_participants(self.write(' [ ] '), 1)), [])
+
+    def test_jsonl(self):
+        path = self.write('{"a": 1}\n\n{"b": 2}\n', 'roster.jsonl')
+        self.assertEqual(list(utils.load_participants(path)), [{"a": 1}, {"b": 2}])
+
+    def test_malformed(self):
+        for text in (
+            '[{"a":1} {"b":2}]',  # Missing comma
+            '[{},,{}]',           # Double comma
+            '[,{}]',              # Leading comma
+            '[{},]',              # Trailing comma
+            '[{}',                # Unterminated
+            '[{"a":',             # Cut off mid-value
+            '{"a": 1}',           # Not an array
+        ):
+            for chunk_size in (1, 3, 64 * 1024):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    with self.assertRaises(ValueError):
+                        list(utils.load_participants(self.write(text), chunk_size))
+
+if __name__ == '__main__':
+    unittest.main()
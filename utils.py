@@ -1,22 +1,229 @@
 import json
-from reportlab.lib.utils import simpleSplit
-from reportlab.platypus import Table, TableStyle
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Table
 
 # NOTE: We removed 'import config'. 
 # All functions now accept a 'cfg' object containing the necessary settings.
 
+class LRUCache:
+    """
+    A small bounded mapping that forgets the least recently used entries.
+    Keeps hit/miss counters so cache effectiveness can be inspected.
+    Safe to share between threads.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+# --- TEXT MEASUREMENT CACHES ---
+# Rosters repeat the same values over and over (class names, table keys...),
+# so wrapped lines and word widths are memoized across cards and runs.
+# Shared by every generator in the process; sized from config.TEXT_CACHE_SIZE.
+_wrap_cache = LRUCache(10000)    # (text, font, size, width) -> wrapped lines
+_width_cache = LRUCache(50000)   # (text, font, size) -> width in points
+_glyph_widths = {}               # font name -> (char widths in 1/1000 em, default width)
+
+def set_text_cache_size(maxsize):
+    """Resizes the wrapped-line cache; the word-width cache is kept 5x larger."""
+    _wrap_cache.maxsize = maxsize
+    _width_cache.maxsize = maxsize * 5
+
+def get_text_cache_stats():
+    """Returns {cache name: (hits, misses)} for the text measurement caches."""
+    return {
+        'text_wrap': (_wrap_cache.hits, _wrap_cache.misses),
+        'text_width': (_width_cache.hits, _width_cache.misses)
+    }
+
+def clear_text_caches():
+    """Forgets all measurements, e.g. after re-registering a font under the same name."""
+    _wrap_cache.clear()
+    _width_cache.clear()
+    _glyph_widths.clear()
+
+def _get_glyph_widths(font_name):
+    """
+    Returns the per-character width table of a TrueType font, or None for other
+    fonts (those are measured through ReportLab and cached per word instead).
+    """
+    try:
+        return _glyph_widths[font_name]
+    except KeyError:
+        pass
+    font = pdfmetrics.getFont(font_name)
+    table = None
+    if isinstance(font, TTFont):
+        table = (font.face.charWidths, font.face.defaultWidth)
+    _glyph_widths[font_name] = table
+    return table
+
+def get_string_width(text, font_name, font_size):
+    """
+    Returns the width of text in points, same as pdfmetrics.stringWidth().
+    """
+    key = (text, font_name, font_size)
+    width = _width_cache.get(key)
+    if width is None:
+        table = _get_glyph_widths(font_name)
+        if table is None:
+            width = pdfmetrics.stringWidth(text, font_name, font_size)
+        else:
+            char_widths, default_width = table
+            width = 0.001 * font_size * sum(char_widths.get(ord(c), default_width) for c in text)
+        _width_cache.put(key, width)
+    return width
+
+def _split_line(line, font_name, font_size, max_width):
+    """Greedy word wrap of a single line; same algorithm as ReportLab's simpleSplit."""
+    lines = []
+    space_w = get_string_width(' ', font_name, font_size)
+    words = []
+    w = -space_w
+    for word in line.split():
+        word_w = get_string_width(word, font_name, font_size)
+        if w + space_w + word_w <= max_width or not words:
+            words.append(word)
+            w = w + space_w + word_w
+        else:
+            lines.append(' '.join(words))
+            words = [word]
+            w = word_w
+    if words:
+        lines.append(' '.join(words))
+    return lines
+
 def get_wrapped_text_lines(text, font_name, font_size, max_width):
     """
     Wraps text into lines that fit within max_width.
     This function is 'pure' and doesn't need the config object.
+    Results are memoized, so repeated values are only measured once.
     """
     if not text:
         return []
-    return simpleSplit(text, font_name, font_size, max_width)
 
-def prepare_table_data(raw_dict, cfg):
+    key = (text, font_name, font_size, max_width)
+    lines = _wrap_cache.get(key)
+    if lines is None:
+        lines = text.split('\n')
+        if max_width:
+            wrapped = []
+            for line in lines:
+                wrapped.extend(_split_line(line, font_name, font_size, max_width))
+            lines = wrapped
+        lines = tuple(lines)
+        _wrap_cache.put(key, lines)
+    return list(lines)
+
+def get_file_digest(path):
+    """Returns the SHA-256 of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_participants(path, chunk_size=64 * 1024):
     """
-    Converts JSON dict to a List of Lists format required by ReportLab Table.
+    Yields participants one at a time from a JSON Lines file (.jsonl, one object
+    per line) or a JSON array file, without loading the whole file into memory.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buf = ''
+        pos = 0
+        eof = False
+        count = 0
+        # What comes next: '[', the first participant (or ']'), a participant, or ',' / ']'
+        expect = '['
+        while True:
+            # Skip whitespace, reading more when the buffer runs dry
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+
+            if pos < len(buf):
+                char = buf[pos]
+                if expect == '[':
+                    if char != '[':
+                        raise ValueError(f"{path}: expected a JSON array of participants")
+                    expect = 'first'
+                    pos += 1
+                    continue
+                if expect == 'separator':
+                    if char == ']':
+                        return
+                    if char != ',':
+                        raise ValueError(f"{path}: expected ',' or ']' after participant {count}")
+                    expect = 'value'
+                    pos += 1
+                    continue
+                if char == ']' and expect == 'first':
+                    return
+                if char in ',]':
+                    raise ValueError(f"{path}: expected participant {count + 1}, found '{char}'")
+
+                # A value must be followed by ',' or ']', so one ending exactly at the
+                # end of the buffer may be cut short (e.g. a number split across reads)
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    end = None
+                if end is not None and (end < len(buf) or eof):
+                    yield value
+                    count += 1
+                    pos = end
+                    expect = 'separator'
+                    continue
+            if eof:
+                if pos < len(buf):
+                    decoder.raw_decode(buf, pos)  # Raises the JSON error
+                raise ValueError(f"{path}: unexpected end of file")
+
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+def prepare_table_rows(raw_dict, cfg):
+    """
+    Converts JSON dict to a list of [key_lines, value_lines] rows, with both
+    cells already wrapped to their column width.
     """
     if not raw_dict:
         return None
@@ -32,23 +239,122 @@ def prepare_table_data(raw_dict, cfg):
         return None
 
     # Access settings from the passed 'cfg' object instead of global 'config'
-    col_width_key = cfg.COL_WIDTH * cfg.TABLE_OPTS['key_col_ratio']
-    col_width_val = cfg.COL_WIDTH * (1 - cfg.TABLE_OPTS['key_col_ratio'])
+    font = cfg.TABLE_OPTS['font']
+    size = cfg.TABLE_OPTS['size']
+    key_text_width = cfg.TABLE_KEY_WIDTH - 6
+    val_text_width = cfg.TABLE_VALUE_WIDTH - 6
 
-    table_data = []
+    table_rows = []
     
     for key, val in raw_dict.items():
         # Wrap the Key
-        key_lines = get_wrapped_text_lines(str(key), cfg.TABLE_OPTS['font'], cfg.TABLE_OPTS['size'], col_width_key - 6)
-        key_text = "\n".join(key_lines)
+        key_lines = get_wrapped_text_lines(str(key), font, size, key_text_width)
         
         # Wrap the Value
-        val_lines = get_wrapped_text_lines(str(val), cfg.TABLE_OPTS['font'], cfg.TABLE_OPTS['size'], col_width_val - 6)
-        val_text = "\n".join(val_lines)
+        val_lines = get_wrapped_text_lines(str(val), font, size, val_text_width)
 
-        table_data.append([key_text, val_text])
+        table_rows.append([key_lines, val_lines])
         
-    return table_data
+    return table_rows
+
+def prepare_table_data(raw_dict, cfg):
+    """
+    Converts JSON dict to a List of Lists format required by ReportLab Table.
+    """
+    table_rows = prepare_table_rows(raw_dict, cfg)
+    if table_rows is None:
+        return None
+    return [["\n".join(key_lines), "\n".join(val_lines)] for key_lines, val_lines in table_rows]
+
+class KeyValueTable:
+    """
+    A card's two-column key/value grid, drawn straight onto the canvas.
+
+    Draws the same thing as the platypus Table from build_table(): cells are
+    top-aligned with TABLE_OPTS padding (6pt left and right), lines are 1.2x
+    the font size apart, and a GRID is drawn around and between all cells.
+    It is measured from the wrapped lines, with no Table, TableStyle or wrap() pass.
+    """
+    # Platypus' default left/right cell padding
+    H_PADDING = 6
+
+    def __init__(self, table_rows, cfg):
+        self.opts = cfg.TABLE_OPTS
+        self.leading = cfg.TABLE_LEADING
+        self.key_width = cfg.TABLE_KEY_WIDTH
+        self.width = cfg.TABLE_KEY_WIDTH + cfg.TABLE_VALUE_WIDTH
+        # An empty cell still takes up one line
+        self.rows = [[lines or [''] for lines in row] for row in table_rows]
+
+        padding = self.opts['padding']
+        row_heights = [max(len(lines) for lines in row) * self.leading + 2 * padding for row in self.rows]
+
+        # Top edge of each row, then the bottom of the table (0). Summed from the
+        # bottom row up with Kahan compensation, as platypus does, so heights
+        # (and therefore pagination) match the Table path exactly.
+        positions = []
+        height = c = 0
+        for h in reversed(row_heights):
+            positions.append(height)
+            y = h - c
+            t = height + y
+            c = (t - height) - y
+            height = t
+        positions.append(height)
+        positions.reverse()
+        self.height = height
+        self.row_positions = positions
+
+    def drawOn(self, canv, x, y):
+        """Draws the table with its bottom-left corner at (x, y)."""
+        opts = self.opts
+        size = opts['size']
+        leading = self.leading
+        text_x = (self.H_PADDING, self.key_width + self.H_PADDING)
+
+        canv.saveState()
+        canv.translate(x, y)
+        canv.saveState()
+
+        canv.setFillColor(opts['text_color'])
+        canv.setFont(opts['font'], size, leading)
+        for row_top, row in zip(self.row_positions, self.rows):
+            for col_x, lines in zip(text_x, row):
+                line_y = row_top - opts['padding'] - size
+                for line in lines:
+                    canv.drawString(col_x, line_y, line)
+                    line_y -= leading
+
+        # Grid: outer box, then the lines between rows and between the two columns
+        w, h = self.width, self.height
+        canv.saveState()
+        canv.setLineCap(1)
+        canv.setLineJoin(1)
+        if opts['border_color']:
+            canv.setStrokeColor(opts['border_color'])
+        if opts['border_width']:
+            canv.setLineWidth(opts['border_width'])
+        canv.line(0, h, w, h)
+        canv.line(0, 0, w, 0)
+        canv.line(0, 0, 0, h)
+        canv.line(w, 0, w, h)
+        for row_y in self.row_positions[1:-1]:
+            canv.line(0, row_y, w, row_y)
+        canv.line(self.key_width, 0, self.key_width, h)
+        canv.restoreState()
+
+        canv.restoreState()
+        canv.restoreState()
+
+def build_table(table_data_list, cfg):
+    """
+    Builds the styled ReportLab Table for a card and wraps it to the column width.
+    Returns (table, height). The wrapped Table can be drawn directly with drawOn().
+    """
+    t = Table(table_data_list, colWidths=[cfg.TABLE_KEY_WIDTH, cfg.TABLE_VALUE_WIDTH])
+    t.setStyle(cfg.TABLE_STYLE)
+    _, h = t.wrap(cfg.COL_WIDTH, cfg.PAGE_HEIGHT)
+    return t, h
 
 def get_table_height(table_data_list, cfg):
     """
@@ -56,40 +362,33 @@ def get_table_height(table_data_list, cfg):
     """
     if not table_data_list:
         return 0
-        
-    col_width_key = cfg.COL_WIDTH * cfg.TABLE_OPTS['key_col_ratio']
-    col_width_val = cfg.COL_WIDTH * (1 - cfg.TABLE_OPTS['key_col_ratio'])
-    
-    t = Table(table_data_list, colWidths=[col_width_key, col_width_val])
-    t.setStyle(TableStyle([
-        ('FONT', (0, 0), (-1, -1), cfg.TABLE_OPTS['font'], cfg.TABLE_OPTS['size']),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), cfg.TABLE_OPTS['padding']),
-        ('TOPPADDING', (0, 0), (-1, -1), cfg.TABLE_OPTS['padding']),
-        ('GRID', (0, 0), (-1, -1), cfg.TABLE_OPTS['border_width'], cfg.TABLE_OPTS['border_color']),
-    ]))
-    
-    # Calculate size (w, h)
-    _, h = t.wrap(cfg.COL_WIDTH, cfg.PAGE_HEIGHT)
+    _, h = build_table(table_data_list, cfg)
     return h
 
-def get_card_metrics(participant_data, cfg):
+def get_card_metrics(participant_data, cfg, timings=None):
     """
-    Calculates detailed height metrics for a participant card.
-    Returns a dictionary separating content height and table height.
+    Calculates the layout of a participant card.
+    Returns a dictionary separating content height and table height, plus
+    everything the generator needs to draw the card without measuring again:
+      - 'text_lines': one entry per PARTICIPANT_STYLE field, holding the field
+        and its wrapped lines as (text, offset from the card top) pairs.
+      - 'table': the KeyValueTable or wrapped platypus Table, depending on
+        TABLE_RENDERER (None if the card has no table). Both draw with drawOn().
+    If a 'timings' dict is given, the seconds spent wrapping text and measuring
+    the table are added to its 'layout_text' and 'layout_tables' entries.
     """
-    # 1. Image Height
-    img_height = cfg.COL_WIDTH / cfg.IMG_ASPECT_RATIO
-    
-    # Calculate dynamic offset matching generator.py (font size + buffer)
-    first_line_size = cfg.PARTICIPANT_STYLE[0]['size']
-    text_gap = first_line_size + cfg.TEXT_GAP_BUFFER
-    
+    if timings is not None:
+        start = time.perf_counter()
+
+    # 1. Image Height, plus the gap to the first line (font size + buffer)
     # This 'non_table_height' represents everything from the top of the card
     # down to the bottom of the last text line (including padding).
-    current_non_table_height = img_height + text_gap 
+    current_non_table_height = cfg.IMG_HEIGHT + cfg.TEXT_GAP
     
     # 2. Text Height (Dynamic)
-    for field in cfg.PARTICIPANT_STYLE:
+    text_lines = []
+    text_width = cfg.TEXT_WIDTH
+    for field in cfg.FIELD_STYLES:
         val = str(participant_data.get(field['key'], '-'))
         full_text = f"{field['label']}{val}"
         
@@ -97,28 +396,48 @@ def get_card_metrics(participant_data, cfg):
             full_text, 
             field['font'], 
             field['size'], 
-            cfg.COL_WIDTH - 4
+            text_width
         )
         
-        line_height = field['size'] * 1.2
-        current_non_table_height += (len(wrapped_lines) * line_height) + field['padding']
+        line_height = field['leading']
+        positioned = []
+        for w_line in wrapped_lines:
+            positioned.append((w_line, current_non_table_height))
+            current_non_table_height += line_height
+        current_non_table_height += field['padding']
+        text_lines.append((field, positioned))
     
+    if timings is not None:
+        text_done = time.perf_counter()
+        timings['layout_text'] = timings.get('layout_text', 0) + text_done - start
+
     # 3. Table Height
+    table = None
     table_height = 0
     raw_table_data = participant_data.get('table_data', {})
     table_exists = False
     
     if raw_table_data:
-        formatted_list = prepare_table_data(raw_table_data, cfg)
-        if formatted_list:
-            table_height = get_table_height(formatted_list, cfg)
+        table_rows = prepare_table_rows(raw_table_data, cfg)
+        if table_rows:
+            if cfg.TABLE_RENDERER == 'direct':
+                table = KeyValueTable(table_rows, cfg)
+                table_height = table.height
+            else:
+                formatted_list = [["\n".join(k), "\n".join(v)] for k, v in table_rows]
+                table, table_height = build_table(formatted_list, cfg)
             table_exists = True
-        
+
+    if timings is not None:
+        timings['layout_tables'] = timings.get('layout_tables', 0) + time.perf_counter() - text_done
+
     return {
         'non_table_height': current_non_table_height,
         'table_height': table_height,
         'table_top_margin': cfg.TABLE_TOP_MARGIN if table_exists else 0,
-        'img_border_width': cfg.IMG_BORDER_WIDTH
+        'img_border_width': cfg.IMG_BORDER_WIDTH,
+        'text_lines': text_lines,
+        'table': table
     }
 
 def calculate_card_height(participant_data, cfg):